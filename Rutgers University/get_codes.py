@@ -1,67 +1,10 @@
-import json
-import requests
 import os
-import re
+import sys
 
-from bs4 import BeautifulSoup
-from time import sleep
-from typing import Any, Callable, Tuple, Union
-from urllib.parse import urlparse, parse_qs
-
-q = type('Quitter', (), {'__repr__': lambda self: quit()})()
-
-def retry(num_retries=3, delay=1, exceptions=(Exception,)):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            for i in range(num_retries):
-                try:
-                    return func(*args, **kwargs)
-                except exceptions as e:
-                    print(e)
-                    sleep(delay)
-                print(f'Retrying attempt {i+2}/{num_retries}')
-        return wrapper
-    return decorator
-
-def write(content: Any, filename: str = 'test.html'):
-    with open(filename, 'w', encoding='utf-8') as f:
-        if filename.endswith('.json'):
-            assert isinstance(content, dict)
-            f.write(json.dumps(content, indent=4, ensure_ascii=False))
-        elif filename.endswith('html'):
-            assert isinstance(content, str)
-            soup = BeautifulSoup(content, 'html.parser')
-            f.write(soup.prettify())
-        else:
-            f.write(str(content))
-
-def dfs(data: Union[dict, list], match_fn: Callable[[Any], bool]) -> Tuple[list, list]:
-    results = []
-    paths = []
-    
-    def helper(data: Any, path=None):
-        if path is None:
-            path = []
-            
-        if match_fn(data):
-            results.append(data)
-            paths.append(path[:])
-            
-        if isinstance(data, dict):
-            for key, value in data.items():
-                helper(value, path + [key])
-        elif isinstance(data, list):
-            for i, item in enumerate(data):
-                helper(item, path + [i])
-                
-    helper(data)
-    return results, paths
+from itertools import product
 
-s = requests.Session()
-s.headers.update({
-    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36',
-    'Accept-Language': 'en-US,en;q=0.9',
-})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scraper import Request, SchoolScraper, Translate, iter_json, register
 
 # https://classes.rutgers.edu/soc/
 
@@ -73,30 +16,36 @@ SEMESTERS = [
 CAMPUSES = ['NB', 'NK', 'CM', 'ONLINE_NB', 'ONLINE_NK', 'ONLINE_CM', 'B', 'CC', 'H', 'CU', 'MC', 'WM', 'L', 'AC', 'J', 'D', 'RV']
 LEVEL = 'U,G'
 
-from itertools import product
-iterator = list(product(SEMESTERS, CAMPUSES))
-ret = {}
-for i, (semester, campus) in enumerate(iterator):
-    r = s.get('https://classes.rutgers.edu/soc/api/courses.json',
-                params = {
-                    'year': semester[1:],
-                    'term': semester[0],
-                    'campus': campus,
-                }
-    )
-    courses = r.json()
-    print(f'Fetched semester {semester} campus {campus} ({i+1}/{len(iterator)}): {len(courses)} courses')
-    for x in courses:
-        ret[x['courseString']] = ret.get(x['courseString'], []) + [{'semester': semester, 'title': x['title']}]
-
-# f'{x["offeringUnitCode"]}:{x["subject"]}:{x["courseNumber"]} {x["title"]}' for x in courses
-# used to be this^
-ret = [f'{k} {v[0]["title"]}' for k, v in ret.items()]
-ret = [re.sub(r'[\-]', ' ', x) for x in ret]
-ret = [re.sub(r'["\'().,+/?@]', '', x) for x in ret]
-ret = sorted(list(set(ret)))
-
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-with open(os.path.join(SCRIPT_DIR, 'codes.json'), 'w', encoding='utf-8') as f:
-    json.dump(ret, f, indent=4, ensure_ascii=False)
 
+@register
+class RutgersScraper(SchoolScraper):
+    school = 'Rutgers University'
+    rules = [
+        Translate({'-': ' '}),
+        Translate(dict.fromkeys('"\'().,+/?@')), # punctuation in titles
+    ]
+
+    def plan(self):
+        for semester, campus in product(SEMESTERS, CAMPUSES):
+            yield Request('GET', 'https://classes.rutgers.edu/soc/api/courses.json', params={
+                'year': semester[1:],
+                'term': semester[0],
+                'campus': campus,
+            }, stream=True, unit=f'{semester}/{campus}')
+
+    def parse(self, response, request):
+        # Each response is several MB of sections; only two fields are needed
+        return [(x['courseString'], x['title']) for x in iter_json(response, 'item', ('courseString', 'title'))]
+
+    def normalize(self, courses):
+        # A course keeps the title from the first semester it appears in
+        titles = {}
+        for course_string, title in courses:
+            titles.setdefault(course_string, title)
+        # f'{x["offeringUnitCode"]}:{x["subject"]}:{x["courseNumber"]} {x["title"]}' for x in courses
+        # used to be this^
+        return super().normalize(f'{k} {v}' for k, v in titles.items())
+
+
+if __name__ == '__main__':
+    RutgersScraper().run()
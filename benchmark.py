@@ -0,0 +1,268 @@
+"""Benchmarks for building, serializing, loading, validating and querying tries.
+
+Runs against every school's codes.json and against synthetic catalogs
+scaled up from them, entirely offline. Run it from the repository root,
+like main.py:
+
+    python3 benchmark.py --output benchmark_results.json
+    python3 benchmark.py --scales 1 10 100 --baseline benchmark_baseline.json
+
+Each operation is timed ``--repeat`` times (min and median are kept) and
+run once more under tracemalloc for its peak memory. With ``--baseline``,
+results are compared against an earlier results file and the run exits
+with status 1 if anything got slower or bigger by more than
+``--threshold``.
+"""
+import argparse
+import gc
+import gzip
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from main import (
+    COURSE_CODE_PATTERN,
+    COURSE_CODES_SCRIPT_OUTPUT_NAME,
+    COURSE_CODES_TRIE_OUTPUT_NAME,
+    Trie,
+    _read_trie,
+    _Tee,
+    check_codes,
+    list_schools,
+)
+
+RESULTS_VERSION = 1
+DEFAULT_SCALES = (1, 10) # 100 works too, but needs several GB of memory for to_dict
+LOOKUPS = 20000 # point lookups per run, half hits and half misses
+SEED = 1234
+
+
+def load_codes(school_name: str):
+    with open(os.path.join(school_name, COURSE_CODES_SCRIPT_OUTPUT_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _mutate(code, alphabet, rng):
+    # Swap, insert or delete one character, staying within the regex
+    chars = list(code)
+    position = rng.randrange(len(chars) + 1)
+    kind = rng.random()
+    if kind < 0.6 and position < len(chars):
+        chars[position] = rng.choice(alphabet)
+    elif kind < 0.9:
+        chars.insert(position, rng.choice(alphabet))
+    elif position < len(chars):
+        del chars[position]
+    return ''.join(chars)
+
+
+def scale_codes(codes, scale: int, seed: int = SEED):
+    """Deterministic synthetic catalog of len(codes) * scale unique, valid codes.
+
+    New codes are real ones with a character or two changed, drawn from the
+    school's own alphabet, so they share prefixes the way a bigger catalog
+    of the same school would.
+    """
+    if scale == 1:
+        return list(codes)
+    rng = random.Random(seed)
+    alphabet = sorted(set(''.join(codes)))
+    result = set(codes)
+    target = len(result) * scale
+    while len(result) < target:
+        code = _mutate(rng.choice(codes), alphabet, rng)
+        if rng.random() < 0.5:
+            code = _mutate(code, alphabet, rng)
+        if COURSE_CODE_PATTERN.match(code):
+            result.add(code)
+    result = list(result)
+    rng.shuffle(result)
+    return result
+
+
+def lookup_queries(codes, count: int = LOOKUPS, seed: int = SEED):
+    """Half codes from the catalog, half near misses that aren't in it."""
+    rng = random.Random(seed)
+    present = set(codes)
+    alphabet = sorted(set(''.join(codes)))
+    hits = [rng.choice(codes) for _ in range(count // 2)]
+    misses = []
+    while len(misses) < count - len(hits):
+        code = _mutate(rng.choice(codes), alphabet, rng)
+        if code not in present:
+            misses.append(code)
+    queries = hits + misses
+    rng.shuffle(queries)
+    return queries
+
+
+def _timed(fn, repeat: int):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _peak_memory(fn):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_dataset(name, codes, workdir, repeat: int = 3, memory: bool = True):
+    """Time every operation on one catalog. Returns {operation: measurements}."""
+    trie = Trie()
+    trie.build(codes)
+    plain_path = os.path.join(workdir, COURSE_CODES_TRIE_OUTPUT_NAME)
+    gz_path = plain_path + '.gz'
+    queries = lookup_queries(codes)
+
+    def build():
+        Trie().build(codes)
+
+    def write():
+        # Same single-encode, two-file write as create_trie
+        with open(plain_path, 'wb') as plain, gzip.open(gz_path, 'wb', compresslevel=9) as compressed:
+            tee = _Tee(plain, compressed)
+            for chunk in trie.iter_json():
+                tee.write(chunk.encode('utf-8'))
+
+    def lookups():
+        contains = trie.contains
+        for query in queries:
+            contains(query)
+
+    def from_dict():
+        Trie.from_dict(state['dict'])
+
+    operations = {
+        'build': build,
+        'to_dict': trie.to_dict,
+        'write': write,
+        'from_dict': from_dict,
+        'load': lambda: _read_trie(gz_path),
+        'search': trie.search,
+        'validate': lambda: check_codes(name, trie, codes),
+        'lookups': lookups,
+    }
+    write() # load reads the file written here
+    state = {}
+    results = {}
+    for operation, fn in operations.items():
+        # The nested dict is several times the size of the trie, so only
+        # keep it around while it is being measured
+        state['dict'] = trie.to_dict() if operation == 'from_dict' else None
+        times = _timed(fn, repeat)
+        results[operation] = {
+            'min': round(min(times), 6),
+            'median': round(statistics.median(times), 6),
+            'peak_bytes': _peak_memory(fn) if memory else None,
+        }
+        print(f"  {operation:<10} {min(times) * 1000:10.2f} ms" + (f" {results[operation]['peak_bytes'] / 2**20:9.1f} MiB" if memory else ''))
+    state.clear()
+    results['lookups']['per_second'] = round(len(queries) / results['lookups']['min'])
+    results['sizes'] = {'json': os.path.getsize(plain_path), 'gzip': os.path.getsize(gz_path), 'nodes': len(trie.ends)}
+    return results
+
+
+def run(schools, scales, repeat: int = 3, memory: bool = True):
+    results = {
+        'version': RESULTS_VERSION,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'started': time.time(),
+        'repeat': repeat,
+        'datasets': {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for school in schools:
+            real = load_codes(school)
+            for scale in scales:
+                codes = scale_codes(real, scale)
+                name = f"{school} x{scale}"
+                print(f"{name} ({len(codes):,} codes)")
+                dataset = benchmark_dataset(school, codes, workdir, repeat, memory)
+                dataset['codes'] = len(codes)
+                results['datasets'][name] = dataset
+    return results
+
+
+def compare(results, baseline, threshold: float = 0.25, min_seconds: float = 0.005):
+    """Regressions of results against baseline: (dataset, operation, metric, old, new).
+
+    Times compare the fastest repeat, and are skipped when both are under
+    min_seconds, where timer noise dominates.
+    """
+    regressions = []
+    for name, dataset in results['datasets'].items():
+        old_dataset = baseline.get('datasets', {}).get(name)
+        if old_dataset is None:
+            continue
+        for operation, measured in dataset.items():
+            old = old_dataset.get(operation)
+            if not isinstance(measured, dict) or not isinstance(old, dict) or operation == 'sizes':
+                continue
+            new_time, old_time = measured.get('min'), old.get('min')
+            if new_time and old_time and max(new_time, old_time) >= min_seconds and new_time > old_time * (1 + threshold):
+                regressions.append((name, operation, 'seconds', old_time, new_time))
+            new_peak, old_peak = measured.get('peak_bytes'), old.get('peak_bytes')
+            if new_peak and old_peak and new_peak > old_peak * (1 + threshold):
+                regressions.append((name, operation, 'peak_bytes', old_peak, new_peak))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark trie build, serialization, loading, validation and lookups.")
+    parser.add_argument('schools', nargs='*', help='Schools to benchmark (default: all of them).')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES), help='Catalog sizes as multiples of the real one (default: 1 10).')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per operation.')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='Skip the tracemalloc peak memory runs.')
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help='Where to write the results.')
+    parser.add_argument('--baseline', type=str, default=None, help='Earlier results file to check for regressions.')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown or memory growth before flagging (0.25 = 25%%).')
+    args = parser.parse_args()
+
+    if args.schools:
+        missing = [s for s in args.schools if not os.path.exists(os.path.join(s, COURSE_CODES_SCRIPT_OUTPUT_NAME))]
+        if missing:
+            parser.error(f"no {COURSE_CODES_SCRIPT_OUTPUT_NAME} for: {', '.join(missing)}")
+        schools = args.schools
+    else:
+        # Like create-trie --all, schools without codes yet are left out
+        schools = sorted(
+            school for school in list_schools()
+            if os.path.exists(os.path.join(school, COURSE_CODES_SCRIPT_OUTPUT_NAME))
+        )
+
+    results = run(schools, args.scales, args.repeat, args.memory)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions against {args.baseline} (over {args.threshold:.0%}):")
+            for name, operation, metric, old, new in regressions:
+                print(f"  {name} {operation} {metric}: {old} -> {new} ({new / old - 1:+.0%})")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,82 +1,735 @@
 import argparse
+import asyncio
+import contextlib
 import gzip
+import hashlib
+import heapq
+import io
 import json
+import mmap
 import os
 import shutil
+import struct
+import sys
 import re
+import threading
+import time
+import zlib
+
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from http import HTTPStatus
+from itertools import accumulate, groupby, islice, repeat
+from urllib.parse import parse_qs, urlsplit
 
 with open('course_code_regex.txt', 'r', encoding='utf-8') as f:
     COURSE_CODE_REGEX = f.read().strip()
 assert '$' not in COURSE_CODE_REGEX[1:-1], "Regex cannot contain $ as it is used as end marker in trie"
+COURSE_CODE_PATTERN = re.compile(COURSE_CODE_REGEX)
 
 COURSE_CODES_SCRIPT_NAME = 'get_codes.py' # First, implement get_codes.py for a school
 COURSE_CODES_SCRIPT_OUTPUT_NAME = 'codes.json' # Next, run get_codes.py to produce this
 COURSE_CODES_TRIE_OUTPUT_NAME = 'codes_trie.json' # Finally, run create_trie to produce this
+COURSE_CODES_TRIE_BINARY_NAME = 'codes_trie.bin' # Written by create_trie alongside the JSON, for MappedTrie
+COURSE_CODES_DAWG_OUTPUT_NAME = 'codes_dawg.json' # Or, run create_trie --format dawg to produce this
+COURSE_CODES_TRIE_MANIFEST_NAME = 'codes_trie.manifest.json' # Inputs of the last create_trie, to skip unchanged schools
+TRIE_FORMATS = ('trie', 'dawg')
+COURSE_CODES_INDEX_NAME = 'codes_index.json.gz' # Written by build-index, covers every school
+SCRAPE_REPORT_NAME = 'scrape_report.json' # Written by get-codes, metrics of the last scrape
 
-class TrieNode:
-    def __init__(self):
-        self.children = {}
-        self.is_end = False
+def _common_prefix_length(a, b):
+    # Binary search on slice equality keeps the character comparisons in C
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
 
 class Trie:
+    """Compact trie stored in flat parallel buffers instead of per-character objects.
+
+    Nodes are laid out in depth-first (preorder) order. For node ``i``:
+      - ``labels[i]`` is the character on the edge leading into it,
+      - ``ends[i]`` is 1 if a code ends there,
+      - ``skip[i]`` is the index just past its subtree.
+    The first child of ``i`` is ``i + 1`` and each next sibling is found by
+    following ``skip``. Node 0 is the root. ``ranks[i]`` counts the codes
+    ending before node ``i``, so any subtree's code count is a subtraction.
+    """
     END_MARKER = '$'
-    
+    ROOT = 0
+    BINARY_MAGIC = b'CTRI'
+    BINARY_VERSION = 2 # 2: labels are UTF-8 bytes
+    BINARY_HEADER = '<4sII4x' # magic, version, node count, padded to 16 bytes
+
     def __init__(self):
-        self.root = TrieNode()
+        self.labels = '\0'
+        self.ends = bytearray(1)
+        self.skip = array('I', [1])
+        self.ranks = array('I', [0, 0])
+        self._pending = set() # codes inserted since the last compaction
+
+    def __len__(self):
+        self._compact()
+        return self.ranks[-1]
+
+    def __contains__(self, code):
+        return self.contains(code)
 
     def insert(self, code):
-        node = self.root
-        for char in code:
-            if char not in node.children:
-                node.children[char] = TrieNode()
-            node = node.children[char]
-        node.is_end = True
+        """Add one code. Meant for batches: inserts are buffered, contains
+        and has_prefix see them right away, and they are merged into the
+        flat layout (a pass over every code) by the next operation that
+        needs node positions, such as find, complete or iter_codes. Prefer
+        build for many codes at once."""
+        self._pending.add(code)
 
     def build(self, codes):
+        self._pending.update(codes)
+        self._compact()
+
+    def _compact(self):
+        if not self._pending:
+            return
+        pending = sorted(self._pending)
+        self._pending = set()
+        # The existing codes come out sorted, so a linear merge is enough
+        merged = heapq.merge(self._iter_codes(self.ROOT, ''), pending)
+        self._build_sorted([code for code, _ in groupby(merged)])
+
+    def _build_sorted(self, codes):
+        # codes must be sorted and unique: each one only appends the part
+        # that is not shared with the previous code, so the build is linear
+        capacity = 1 + sum(map(len, codes)) # upper bound, trimmed below
+        labels = ['\0']
+        ends = bytearray(capacity)
+        skip = array('I', [0]) * capacity
+        path = [self.ROOT] # path[d] is the node at depth d of the previous code
+        size = 1
+        prev = ''
         for code in codes:
-            self.insert(code)
+            lcp = _common_prefix_length(prev, code)
+            for node in path[lcp + 1:]:
+                skip[node] = size
+            del path[lcp + 1:]
+            labels.append(code[lcp:])
+            path.extend(range(size, size + len(code) - lcp))
+            size += len(code) - lcp
+            ends[size - 1] = 1
+            prev = code
+        for node in path:
+            skip[node] = size
+        del ends[size:]
+        del skip[size:]
+        self.labels = ''.join(labels)
+        self.ends = ends
+        self.skip = skip
+        self.ranks = array('I', accumulate(ends, initial=0))
+
+    def children(self, node=ROOT):
+        self._compact()
+        child = node + 1
+        end = self.skip[node]
+        while child < end:
+            yield self.labels[child], child
+            child = self.skip[child]
+
+    def find(self, prefix, node=ROOT):
+        """Return the node reached by following prefix, or None."""
+        self._compact()
+        return self._find(prefix, node)
 
-    def to_dict(self, node=None):
+    def _find(self, prefix, node=ROOT):
+        labels, skip = self.labels, self.skip
+        for char in prefix:
+            child = node + 1
+            end = skip[node]
+            while child < end and labels[child] != char:
+                child = skip[child]
+            if child >= end:
+                return None
+            node = child
+        return node
+
+    def contains(self, code):
+        # Checks pending inserts as well, so inserts and lookups can be mixed without compacting
+        if code in self._pending:
+            return True
+        node = self._find(code)
+        return node is not None and self.ends[node] == 1
+
+    def has_prefix(self, prefix):
+        if self._find(prefix) is not None:
+            return True
+        return any(code.startswith(prefix) for code in self._pending)
+
+    def count(self, prefix=''):
+        """Number of codes starting with prefix, without visiting them."""
+        node = self.find(prefix)
         if node is None:
-            node = self.root
-        result = {}
-        if node.is_end:
-            result[self.END_MARKER] = True
-        for char, child in node.children.items():
-            result[char] = self.to_dict(child)
+            return 0
+        return self.ranks[self.skip[node]] - self.ranks[node]
+
+    def complete(self, prefix, limit=None, offset=0):
+        """Return up to limit codes starting with prefix, in sorted order,
+        skipping the first offset of them.
+
+        The first code to return is located from the rank counts, so the
+        work done grows with offset's depth and the number of codes
+        returned, not with the size of the subtree under prefix.
+        """
+        node = self.find(prefix)
+        if node is None:
+            return []
+        target = self.ranks[node] + offset
+        end = self.skip[node]
+        if target >= self.ranks[end]:
+            return []
+        start = bisect_right(self.ranks, target) - 1
+        return list(islice(self._iter_from(start, end), limit))
+
+    def fuzzy_search(self, query, max_edits=1, limit=None):
+        """Return (code, distance) for codes within max_edits Levenshtein
+        edits of query, closest first and then in sorted order.
+
+        Walks the trie keeping one row of the edit distance table per node
+        (the row of a child is computed from its parent's), only filling
+        the cells within max_edits of the diagonal. A subtree is skipped as
+        soon as every cell in its row exceeds max_edits, so the cost grows
+        with the neighbourhood of query rather than the number of codes.
+        """
+        if max_edits < 0:
+            raise ValueError("max_edits must not be negative")
+        self._compact()
+        labels, ends, skip = self.labels, self.ends, self.skip
+        n = len(query)
+        k = max_edits
+        big = k + 1 # every distance over k is stored as k + 1
+        root_row = [min(j, big) for j in range(n + 1)]
+        matches = []
+        if ends[self.ROOT] and root_row[n] <= k:
+            matches.append((root_row[n], ''))
+        buffer = []
+        rows = [root_row] # rows[d] is the row of the node at depth d on the current path
+        stops = [] # subtree ends of the nodes whose labels are in buffer
+        i = self.ROOT + 1
+        end = skip[self.ROOT]
+        while i < end:
+            while stops and stops[-1] <= i:
+                stops.pop()
+                buffer.pop()
+                rows.pop()
+            parent = rows[-1]
+            char = labels[i]
+            depth = len(rows)
+            row = [big] * (n + 1)
+            row[0] = best = depth if depth <= k else big
+            for j in range(max(1, depth - k), min(n, depth + k) + 1):
+                value = parent[j - 1] if query[j - 1] == char else parent[j - 1] + 1
+                if parent[j] + 1 < value:
+                    value = parent[j] + 1
+                if row[j - 1] + 1 < value:
+                    value = row[j - 1] + 1
+                if value > big:
+                    value = big
+                row[j] = value
+                if value < best:
+                    best = value
+            if best > k:
+                i = skip[i]
+                continue
+            buffer.append(char)
+            rows.append(row)
+            stops.append(skip[i])
+            if ends[i] and row[n] <= k:
+                matches.append((row[n], ''.join(buffer)))
+            i += 1
+        matches.sort()
+        return [(code, distance) for distance, code in islice(matches, limit)]
+
+    def _iter_from(self, start, end):
+        # Walk down from the root to start, then continue the preorder
+        # enumeration from there until end
+        labels, ends, skip = self.labels, self.ends, self.skip
+        buffer = []
+        stops = [] # subtree ends of the nodes whose labels are in buffer
+        node = self.ROOT
+        while node != start:
+            node += 1
+            while skip[node] <= start:
+                node = skip[node]
+            buffer.append(labels[node])
+            stops.append(skip[node])
+        if ends[start]:
+            yield ''.join(buffer)
+        for i in range(start + 1, end):
+            while stops and stops[-1] <= i:
+                stops.pop()
+                buffer.pop()
+            buffer.append(labels[i])
+            stops.append(skip[i])
+            if ends[i]:
+                yield ''.join(buffer)
+
+    def to_dict(self, node=ROOT):
+        self._compact()
+        labels, ends, skip = self.labels, self.ends, self.skip
+        result = {self.END_MARKER: True} if ends[node] else {}
+        # stack[-1] is (end of subtree, dict) for the deepest open node
+        stack = [(skip[node], result)]
+        for i in range(node + 1, skip[node]):
+            while stack[-1][0] <= i:
+                stack.pop()
+            child = {self.END_MARKER: True} if ends[i] else {}
+            stack[-1][1][labels[i]] = child
+            stack.append((skip[i], child))
         return result
 
+    def iter_json(self, node=ROOT):
+        """Yield the JSON text of to_dict(node) in chunks, without building the dict.
+
+        The output is identical to json.dumps(self.to_dict(node)).
+        """
+        self._compact()
+        labels, ends, skip = self.labels, self.ends, self.skip
+        keys = {}
+        end_item = json.dumps(self.END_MARKER) + ': true'
+        parts = ['{']
+        if ends[node]:
+            parts.append(end_item)
+        stops = [skip[node]] # subtree ends of the open dicts
+        empty = [not ends[node]] # whether each open dict has no items yet
+        for i in range(node + 1, skip[node]):
+            while stops[-1] <= i:
+                stops.pop()
+                empty.pop()
+                parts.append('}')
+            char = labels[i]
+            key = keys.get(char)
+            if key is None:
+                key = keys[char] = json.dumps(char) + ': {'
+            if not empty[-1]:
+                parts.append(', ')
+            empty[-1] = False
+            parts.append(key)
+            if ends[i]:
+                parts.append(end_item)
+            stops.append(skip[i])
+            empty.append(not ends[i])
+            if len(parts) >= 8192:
+                yield ''.join(parts)
+                parts = []
+        parts.append('}' * len(stops))
+        yield ''.join(parts)
+
     @staticmethod
     def from_dict(d):
         trie = Trie()
-        trie.root = Trie._dict_to_trie(d)
+        trie.build(Trie._dict_to_trie(d))
         return trie
 
     @staticmethod
     def _dict_to_trie(d):
-        node = TrieNode()
-        if Trie.END_MARKER in d:
-            node.is_end = True
-        for char, child_dict in d.items():
-            if char != Trie.END_MARKER:
-                node.children[char] = Trie._dict_to_trie(child_dict)
+        # Yields the codes stored in a nested trie dict using an explicit
+        # stack of item iterators and one shared character buffer
+        buffer = []
+        stack = [iter(d.items())]
+        while stack:
+            for char, child in stack[-1]:
+                if char == Trie.END_MARKER:
+                    yield ''.join(buffer)
+                else:
+                    buffer.append(char)
+                    stack.append(iter(child.items()))
+                    break
+            else:
+                stack.pop()
+                if buffer:
+                    buffer.pop()
+
+    def _iter_codes(self, node, prefix):
+        labels, ends, skip = self.labels, self.ends, self.skip
+        if ends[node]:
+            yield prefix
+        buffer = [prefix]
+        stops = [] # subtree ends of the nodes whose labels are in buffer
+        for i in range(node + 1, skip[node]):
+            while stops and stops[-1] <= i:
+                stops.pop()
+                buffer.pop()
+            buffer.append(labels[i])
+            stops.append(skip[i])
+            if ends[i]:
+                yield ''.join(buffer)
+
+    def iter_codes(self, node=ROOT, prefix=''):
+        """Lazily yield every code below node, in sorted order."""
+        self._compact()
+        yield from self._iter_codes(node, prefix)
+
+    def search(self, node=ROOT, prefix=''):
+        return list(self.iter_codes(node, prefix))
+
+    def to_bytes(self):
+        """Serialize to the codes_trie.bin layout read by MappedTrie.
+
+        After the header come the skip offsets (little-endian uint32), the
+        end flags and the labels, one entry per node each. Labels are single
+        UTF-8 bytes, so a character outside ASCII takes one node per byte.
+        """
+        self._compact()
+        source = self
+        if not self.labels.isascii():
+            # Rebuild over the UTF-8 bytes, each held as the latin-1 character
+            # of the same value; UTF-8 keeps code point order, so the codes
+            # are still sorted
+            source = Trie()
+            source._build_sorted([code.encode('utf-8').decode('latin-1') for code in self._iter_codes(self.ROOT, '')])
+        skip = array('I', source.skip)
+        if sys.byteorder != 'little':
+            skip.byteswap()
+        header = struct.pack(self.BINARY_HEADER, self.BINARY_MAGIC, self.BINARY_VERSION, len(source.ends))
+        return header + skip.tobytes() + bytes(source.ends) + source.labels.encode('latin-1')
+
+class MappedTrie:
+    """Read-only trie that queries a codes_trie.bin file in place through mmap.
+
+    Nothing is deserialized, so opening is O(1) and the mapped pages are
+    shared through the OS page cache by every process reading the file.
+    Nodes use the same preorder layout as Trie, but labels are UTF-8 bytes.
+    """
+    ROOT = 0
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = struct.unpack_from(Trie.BINARY_HEADER, self._mmap)
+        if magic != Trie.BINARY_MAGIC or version != Trie.BINARY_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {Trie.BINARY_VERSION} binary trie")
+        offset = struct.calcsize(Trie.BINARY_HEADER)
+        self._view = memoryview(self._mmap)
+        skip = self._view[offset:offset + 4 * count]
+        if sys.byteorder == 'little':
+            self.skip = skip.cast('I')
+        else:
+            # array() over a memoryview would make one element per byte
+            self.skip = array('I')
+            self.skip.frombytes(skip)
+            self.skip.byteswap()
+        offset += 4 * count
+        self.ends = self._view[offset:offset + count]
+        self.labels = self._view[offset + count:offset + 2 * count]
+
+    def close(self):
+        for view in (self.skip, self.ends, self.labels, self._view):
+            if isinstance(view, memoryview):
+                view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return sum(self.ends)
+
+    def __contains__(self, code):
+        return self.contains(code)
+
+    def find(self, prefix, node=ROOT):
+        """Return the node reached by following prefix, or None."""
+        try:
+            encoded = prefix.encode('utf-8')
+        except UnicodeEncodeError:
+            return None
+        labels, skip = self.labels, self.skip
+        for byte in encoded:
+            child = node + 1
+            end = skip[node]
+            while child < end and labels[child] != byte:
+                child = skip[child]
+            if child >= end:
+                return None
+            node = child
         return node
 
-    def search(self, node=None, prefix='', results=None):
-        if results is None:
-            results = []
+    def contains(self, code):
+        node = self.find(code)
+        return node is not None and self.ends[node] == 1
+
+    def has_prefix(self, prefix):
+        return self.find(prefix) is not None
+
+    def iter_codes(self, node=ROOT, prefix=''):
+        """Lazily yield every code below node, in sorted order."""
+        labels, ends, skip = self.labels, self.ends, self.skip
+        if ends[node]:
+            yield prefix
+        buffer = bytearray(prefix.encode('utf-8'))
+        stops = [] # subtree ends of the nodes whose labels are in buffer
+        for i in range(node + 1, skip[node]):
+            while stops and stops[-1] <= i:
+                stops.pop()
+                buffer.pop()
+            buffer.append(labels[i])
+            stops.append(skip[i])
+            if ends[i]:
+                yield buffer.decode('utf-8')
+
+    def search(self, node=ROOT, prefix=''):
+        return list(self.iter_codes(node, prefix))
+
+class Dawg:
+    """Minimized trie (directed acyclic word graph) where equal suffixes share states.
+
+    States are stored in flat buffers like Trie nodes: the edges leaving
+    state ``s`` are ``labels[first[s]:first[s + 1]]`` leading to
+    ``targets[first[s]:first[s + 1]]`` and ``ends[s]`` flags accepting states.
+    State 0 is the root and every edge points to a higher-numbered state.
+    """
+    FORMAT = 'dawg'
+    VERSION = 1
+    ROOT = 0
+
+    def __init__(self, labels='', first=None, targets=None, ends=None):
+        self.labels = labels
+        self.first = first if first is not None else array('I', [0, 0])
+        self.targets = targets if targets is not None else array('I')
+        self.ends = ends if ends is not None else bytearray(1)
+
+    @staticmethod
+    def from_trie(trie):
+        trie._compact()
+        labels, ends, skip = trie.labels, trie.ends, trie.skip
+        # Children always come after their parent in the trie's preorder
+        # layout, so walking it backwards classifies every subtree before
+        # the node that owns it. Nodes with the same signature are merged.
+        register = {}
+        states = []
+        state_of = array('I', [0]) * len(labels)
+        for i in range(len(labels) - 1, -1, -1):
+            edges = []
+            child = i + 1
+            while child < skip[i]:
+                edges.append((labels[child], state_of[child]))
+                child = skip[child]
+            signature = (ends[i], tuple(edges))
+            state = register.get(signature)
+            if state is None:
+                state = register[signature] = len(states)
+                states.append(signature)
+            state_of[i] = state
+
+        # States were registered leaves first; reversing that order puts
+        # the root at 0 and every edge target after its source
+        order = {state: len(states) - 1 - state for state in range(len(states))}
+        dawg_labels = []
+        first = array('I', [0])
+        targets = array('I')
+        dawg_ends = bytearray(len(order))
+        for state in range(len(states) - 1, -1, -1):
+            is_end, edges = states[state]
+            dawg_ends[order[state]] = is_end
+            for char, target in edges:
+                dawg_labels.append(char)
+                targets.append(order[target])
+            first.append(len(targets))
+        return Dawg(''.join(dawg_labels), first, targets, dawg_ends)
+
+    def __len__(self):
+        # Number of codes, counted per state from the leaves up
+        counts = [0] * len(self.ends)
+        for state in range(len(self.ends) - 1, -1, -1):
+            counts[state] = self.ends[state] + sum(
+                counts[t] for t in self.targets[self.first[state]:self.first[state + 1]])
+        return counts[self.ROOT] if counts else 0
+
+    def __contains__(self, code):
+        return self.contains(code)
+
+    def children(self, state=ROOT):
+        for edge in range(self.first[state], self.first[state + 1]):
+            yield self.labels[edge], self.targets[edge]
+
+    def find(self, prefix, state=ROOT):
+        """Return the state reached by following prefix, or None."""
+        labels, first, targets = self.labels, self.first, self.targets
+        for char in prefix:
+            edge = labels.find(char, first[state], first[state + 1])
+            if edge < 0:
+                return None
+            state = targets[edge]
+        return state
+
+    def contains(self, code):
+        state = self.find(code)
+        return state is not None and self.ends[state] == 1
+
+    def iter_codes(self, state=ROOT, prefix=''):
+        """Lazily yield every code below state, in sorted order."""
+        labels, first, targets, ends = self.labels, self.first, self.targets, self.ends
+        if ends[state]:
+            yield prefix
+        buffer = [prefix]
+        # each entry is [next edge to follow, last edge] of a state on the path
+        stack = [[first[state], first[state + 1]]]
+        while stack:
+            top = stack[-1]
+            if top[0] == top[1]:
+                stack.pop()
+                buffer.pop()
+                continue
+            edge = top[0]
+            top[0] += 1
+            target = targets[edge]
+            buffer.append(labels[edge])
+            if ends[target]:
+                yield ''.join(buffer)
+            stack.append([first[target], first[target + 1]])
+
+    def search(self, state=ROOT, prefix=''):
+        return list(self.iter_codes(state, prefix))
+
+    def to_dict(self):
+        # Targets are stored relative to their source state: n >= 0 means
+        # "source + 1 + n" and -k means "the k-th state from the end". Most
+        # edges either lead to the next state or to one of the few shared
+        # states at the end (e.g. the final digit of a code), so both forms
+        # stay small and gzip well.
+        total = len(self.ends)
+        targets = []
+        for state in range(total):
+            for edge in range(self.first[state], self.first[state + 1]):
+                target = self.targets[edge]
+                forward = target - state - 1
+                targets.append(forward if forward < total - target else target - total)
+        return {
+            'format': self.FORMAT,
+            'version': self.VERSION,
+            'labels': self.labels,
+            'counts': [self.first[s + 1] - self.first[s] for s in range(total)],
+            'targets': targets,
+            'ends': ''.join('1' if e else '0' for e in self.ends),
+        }
+
+    @staticmethod
+    def from_dict(d):
+        if d.get('format') != Dawg.FORMAT or d.get('version') != Dawg.VERSION:
+            raise ValueError(f"Unsupported DAWG format: {d.get('format')} v{d.get('version')}")
+        total = len(d['counts'])
+        first = array('I', [0])
+        targets = array('I')
+        encoded = iter(d['targets'])
+        for state, count in enumerate(d['counts']):
+            for _ in range(count):
+                target = next(encoded)
+                targets.append(state + 1 + target if target >= 0 else total + target)
+            first.append(len(targets))
+        ends = bytearray(d['ends'], 'ascii').translate(bytes.maketrans(b'01', b'\x00\x01'))
+        return Dawg(d['labels'], first, targets, ends)
+
+class SchoolIndex:
+    """One trie over every school's codes, tagged with which schools offer each code.
+
+    Bit ``i`` of a mask stands for ``schools[i]``. Masks are packed into
+    fixed-width little-endian slots: ``code_masks`` has one per code in trie
+    rank order and ``prefix_masks`` one per trie node covering its whole
+    subtree, so exact and prefix lookups across all schools are a single
+    walk down the trie.
+    """
+    VERSION = 1
+
+    def __init__(self, schools, masks, digests=None):
+        # masks maps each code to the bitmap of schools offering it
+        self.schools = list(schools)
+        self.digests = dict(digests or {})
+        self.width = max(1, (len(self.schools) + 7) // 8)
+        self.trie = Trie()
+        self.trie.build(masks)
+
+        trie = self.trie
+        code_masks = [masks[code] for code in trie.iter_codes()]
+        node_masks = [0] * len(trie.ends)
+        for i in range(len(trie.ends) - 1, -1, -1):
+            mask = code_masks[trie.ranks[i]] if trie.ends[i] else 0
+            child = i + 1
+            while child < trie.skip[i]:
+                mask |= node_masks[child]
+                child = trie.skip[child]
+            node_masks[i] = mask
+        self.code_masks = self._pack(code_masks)
+        self.prefix_masks = self._pack(node_masks)
+
+    def _pack(self, masks):
+        return b''.join(mask.to_bytes(self.width, 'little') for mask in masks)
+
+    def _mask_at(self, packed, i):
+        return int.from_bytes(packed[i * self.width:(i + 1) * self.width], 'little')
+
+    def _names(self, mask):
+        return [school for bit, school in enumerate(self.schools) if mask >> bit & 1]
+
+    def masks(self):
+        """Return a dict of every code to its school bitmap."""
+        return {code: self._mask_at(self.code_masks, rank) for rank, code in enumerate(self.trie.iter_codes())}
+
+    def schools_for(self, code):
+        """Schools offering exactly this code."""
+        node = self.trie.find(code)
+        if node is None or not self.trie.ends[node]:
+            return []
+        return self._names(self._mask_at(self.code_masks, self.trie.ranks[node]))
+
+    def schools_with_prefix(self, prefix):
+        """Schools offering at least one code starting with prefix."""
+        node = self.trie.find(prefix)
         if node is None:
-            node = self.root
-        if node.is_end:
-            results.append(prefix)
-        for char, child in node.children.items():
-            self.search(child, prefix + char, results)
-        return results
+            return []
+        return self._names(self._mask_at(self.prefix_masks, node))
+
+    def complete(self, prefix, limit=None, offset=0):
+        """Return (code, schools) pairs for codes starting with prefix."""
+        node = self.trie.find(prefix)
+        if node is None:
+            return []
+        # complete() returns consecutive codes, so their ranks are too
+        first = self.trie.ranks[node] + offset
+        return [
+            (code, self._names(self._mask_at(self.code_masks, first + i)))
+            for i, code in enumerate(self.trie.complete(prefix, limit, offset))
+        ]
+
+    def to_dict(self):
+        masks = self.masks()
+        return {
+            'version': self.VERSION,
+            'schools': self.schools,
+            'digests': self.digests,
+            'codes': list(masks),
+            'masks': list(masks.values()),
+        }
+
+    @staticmethod
+    def from_dict(d):
+        if d.get('version') != SchoolIndex.VERSION:
+            raise ValueError(f"Unsupported index version: {d.get('version')}")
+        return SchoolIndex(d['schools'], dict(zip(d['codes'], d['masks'])), d['digests'])
+
+# Bumped whenever an output layout changes, so create_trie rebuilds everything
+TRIE_FORMAT_VERSIONS = {'trie': Trie.BINARY_VERSION, 'dawg': Dawg.VERSION}
 
 def list_schools():
     return [
         x for x in os.listdir('.')
-        if os.path.isdir(x) and not x.startswith('.') and x not in ('__pycache__', 'env')
+        if os.path.isdir(x) and not x.startswith('.') and x not in ('__pycache__', 'env', 'scraper')
     ]
 
 def cleanup():
@@ -85,19 +738,150 @@ def cleanup():
         shutil.rmtree(os.path.join(school, '__pycache__'), ignore_errors=True)
     print("Cleaned up __pycache__ directories.")
 
+COURSE_CODES_SCRIPT_TEMPLATE = '''import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scraper import Request, SchoolScraper, Sub, Translate, register
+
+
+@register
+class Scraper(SchoolScraper):
+    school = {school_name!r}
+    rules = [
+        # cleanup applied to every code before dedup and the regex check, e.g.
+        # Translate({{'-': ' ', '.': None}}), Sub(r'\\s+', ' ')
+    ]
+
+    # get-codes --all skips this school until plan (or scrape) is implemented
+    #
+    # def plan(self):
+    #     # yield Request('GET', url) for every page that lists course codes
+    #
+    # def parse(self, response, request):
+    #     # return the course codes found in one response
+
+
+if __name__ == '__main__':
+    Scraper().run()
+'''
+
 def create_school(school_name: str):
     os.makedirs(school_name, exist_ok=True)
     with open(os.path.join(school_name, COURSE_CODES_SCRIPT_NAME), 'w') as f:
-        f.write(f'# Placeholder for {COURSE_CODES_SCRIPT_NAME}\n')
+        f.write(COURSE_CODES_SCRIPT_TEMPLATE.format(school_name=school_name))
     print(f"Created directory and placeholder for {school_name}")
 
+def get_codes(school_name: str, cache: bool = True, offline: bool = False):
+    # Imported here so the trie commands keep working without the scraper dependencies
+    from scraper import run_schools
+    error = run_schools([school_name], 1, '.', cache, offline)[school_name]
+    if error:
+        raise ValueError(f"Getting codes failed for {school_name}: {error}")
+
+def get_codes_all(jobs: int = None, cache: bool = True, offline: bool = False):
+    from scraper import load_scraper, run_schools
+    schools = []
+    for school in list_schools():
+        if not os.path.exists(os.path.join(school, COURSE_CODES_SCRIPT_NAME)):
+            continue
+        try:
+            implemented = load_scraper(school, '.').implemented()
+        except Exception:
+            implemented = True # let run_schools report the broken script
+        if not implemented:
+            print(f"Skipping {school}: its {COURSE_CODES_SCRIPT_NAME} is still the create-school placeholder.")
+            continue
+        schools.append(school)
+    errors = run_schools(schools, jobs, '.', cache, offline)
+    failures = [(school, error) for school, error in errors.items() if error]
+    if failures:
+        print(f"\n{len(failures)} of {len(schools)} schools failed:")
+        for school, error in failures:
+            print(f"  {school}: {error}")
+        raise ValueError(f"Getting codes failed for {len(failures)} schools.")
+    print(f"Got codes for all {len(schools)} schools.")
+
+def _seconds(value) -> str:
+    return '-' if value is None else f"{value * 1000:.0f}ms"
 
-def create_trie(school_name: str):
+def scrape_report(school_names):
+    """Print the last scrape's metrics for each school that has a report."""
+    shown = 0
+    for school_name in school_names:
+        path = os.path.join(school_name, SCRAPE_REPORT_NAME)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        summary = report['summary']
+        status = 'unfinished' if report['finished'] is None else time.strftime('%Y-%m-%d %H:%M', time.localtime(report['finished']))
+        print(f"{school_name} ({status}, {summary['wall_seconds']:.1f}s)")
+        print(f"  {summary['requests']} requests, {summary['cached']} cached, {summary['retries']} retries, "
+              f"{summary['failures']} failed, {summary['bytes'] / 1e6:.1f} MB, {summary['requests_per_second']} req/s")
+        latency, parse, codes = summary['latency'], summary['parse'], summary['codes_per_unit']
+        wait = summary.get('wait', {'p50': None, 'p95': None})
+        print(f"  latency p50 {_seconds(latency['p50'])} p95 {_seconds(latency['p95'])} max {_seconds(latency['max'])}; "
+              f"waiting p50 {_seconds(wait['p50'])} p95 {_seconds(wait['p95'])}; "
+              f"parse p50 {_seconds(parse['p50'])} p95 {_seconds(parse['p95'])} total {parse['total']:.1f}s; "
+              f"codes/unit p50 {codes['p50']} p95 {codes['p95']}")
+        for host, stats in report['hosts'].items():
+            latency = stats['latency']
+            print(f"    {host}: {stats['requests']} requests, p50 {_seconds(latency['p50'])} p95 {_seconds(latency['p95'])}, "
+                  f"{stats['bytes'] / 1e6:.1f} MB, {stats['retries']} retries, {stats['failures']} failed, statuses {stats['statuses']}")
+        shown += 1
+    if not shown:
+        print(f"No {SCRAPE_REPORT_NAME} found. Run get-codes first.")
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _trie_outputs(school_name: str, fmt: str):
+    if fmt == 'dawg':
+        names = [COURSE_CODES_DAWG_OUTPUT_NAME, COURSE_CODES_DAWG_OUTPUT_NAME + '.gz']
+    else:
+        names = [COURSE_CODES_TRIE_OUTPUT_NAME, COURSE_CODES_TRIE_OUTPUT_NAME + '.gz', COURSE_CODES_TRIE_BINARY_NAME]
+    return [os.path.join(school_name, name) for name in names]
+
+def _read_manifest(school_name: str):
+    path = os.path.join(school_name, COURSE_CODES_TRIE_MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class _Tee:
+    """Binary file-like object that copies every write to several files."""
+
+    def __init__(self, *files):
+        self.files = files
+
+    def write(self, data):
+        for f in self.files:
+            f.write(data)
+        return len(data)
+
+def create_trie(school_name: str, fmt: str = 'trie', force: bool = False, compresslevel: int = 9):
     path = os.path.join(school_name, COURSE_CODES_SCRIPT_OUTPUT_NAME)
     if not os.path.exists(path):
         print(f"No {COURSE_CODES_SCRIPT_OUTPUT_NAME} found for {school_name}. Please run/implement {COURSE_CODES_SCRIPT_NAME} first.")
         return
 
+    # Skip the build when the inputs match the last one and its outputs are still there
+    fingerprint = {
+        'codes': _file_digest(path),
+        'regex': COURSE_CODE_REGEX,
+        'version': TRIE_FORMAT_VERSIONS[fmt],
+        'compresslevel': compresslevel,
+    }
+    manifest = _read_manifest(school_name)
+    if (not force and manifest.get(fmt) == fingerprint
+            and all(os.path.exists(output) for output in _trie_outputs(school_name, fmt))):
+        print(f"{fmt} for {school_name} is up to date, skipping.")
+        return
+
     with open(path, 'r', encoding='utf-8') as f:
         codes = json.load(f)
 
@@ -106,49 +890,221 @@ def create_trie(school_name: str):
     trie = Trie()
     trie.build(codes)
 
-    trie_dict = trie.to_dict()
+    # Encode the JSON once and write every chunk to the plain and gzipped
+    # files together, instead of building the dict and dumping it twice
+    if fmt == 'dawg':
+        structure = Dawg.from_trie(trie)
+        output_name = COURSE_CODES_DAWG_OUTPUT_NAME
+        chunks = json.JSONEncoder(separators=(',', ':')).iterencode(structure.to_dict())
+    else:
+        structure = trie
+        output_name = COURSE_CODES_TRIE_OUTPUT_NAME
+        chunks = trie.iter_json()
 
-    with open(os.path.join(school_name, COURSE_CODES_TRIE_OUTPUT_NAME), 'w', encoding='utf-8') as f:
-        json.dump(trie_dict, f)
+    with open(os.path.join(school_name, output_name), 'wb') as plain, \
+            gzip.open(os.path.join(school_name, output_name + '.gz'), 'wb', compresslevel=compresslevel) as compressed:
+        tee = _Tee(plain, compressed)
+        for chunk in chunks:
+            tee.write(chunk.encode('utf-8'))
 
-    with gzip.open(os.path.join(school_name, COURSE_CODES_TRIE_OUTPUT_NAME + '.gz'), 'wt', encoding='utf-8') as f:
-        json.dump(trie_dict, f)
+    if fmt == 'trie':
+        # Written aside and moved into place, so a failed build never
+        # leaves a truncated file for MappedTrie to open
+        binary_path = os.path.join(school_name, COURSE_CODES_TRIE_BINARY_NAME)
+        with open(binary_path + '.tmp', 'wb') as f:
+            f.write(trie.to_bytes())
+        os.replace(binary_path + '.tmp', binary_path)
 
     # Compare file sizes
     original_size = os.path.getsize(os.path.join(school_name, COURSE_CODES_SCRIPT_OUTPUT_NAME))
-    trie_size = os.path.getsize(os.path.join(school_name, COURSE_CODES_TRIE_OUTPUT_NAME))
-    trie_gz_size = os.path.getsize(os.path.join(school_name, 
-                                                COURSE_CODES_TRIE_OUTPUT_NAME + '.gz'))
+    trie_size = os.path.getsize(os.path.join(school_name, output_name))
+    trie_gz_size = os.path.getsize(os.path.join(school_name, output_name + '.gz'))
 
+    label = fmt.upper() if fmt == 'dawg' else 'Trie'
     print(f"\nFile sizes:")
     print(f"Original JSON: {original_size:,} bytes")
-    print(f"Trie JSON: {trie_size:,} bytes")
-    print(f"Trie JSON (gzipped): {trie_gz_size:,} bytes")
+    print(f"{label} JSON: {trie_size:,} bytes")
+    print(f"{label} JSON (gzipped): {trie_gz_size:,} bytes")
     print(f"\nSpace savings:")
-    print(f"Trie vs Original: {(1 - trie_size/original_size)*100:.1f}%")
-    print(f"Trie+gzip vs Original: {(1 - trie_gz_size/original_size)*100:.1f}%")
-    assert trie_gz_size < original_size, "Gzipped trie is not smaller than original!"
+    print(f"{label} vs Original: {(1 - trie_size/original_size)*100:.1f}%")
+    print(f"{label}+gzip vs Original: {(1 - trie_gz_size/original_size)*100:.1f}%")
+    assert trie_gz_size < original_size, f"Gzipped {label} is not smaller than original!"
 
-    # Verify reconstruction works
-    reconstructed_trie = Trie.from_dict(trie_dict)
+    # Verify reconstruction works, from the file clients will read
+    with gzip.open(os.path.join(school_name, output_name + '.gz'), 'rt', encoding='utf-8') as f:
+        reconstructed_trie = type(structure).from_dict(json.load(f))
     reconstructed = reconstructed_trie.search()
     print(f"\nVerification: {len(reconstructed)} codes reconstructed")
     assert sorted(reconstructed) == sorted(codes), "Reconstructed codes do not match original!"
+    if fmt == 'trie':
+        with MappedTrie(os.path.join(school_name, COURSE_CODES_TRIE_BINARY_NAME)) as mapped:
+            assert mapped.search() == reconstructed, "Binary trie does not match original!"
+
+    manifest[fmt] = fingerprint
+    with open(os.path.join(school_name, COURSE_CODES_TRIE_MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
     # # find which reconstructed codes are not in original
     # from collections import Counter
     # original_counter = Counter(codes)
     # print([x for x in reconstructed if original_counter[x] >1])
     
 
+def load_dawg(school_name: str) -> Dawg:
+    with gzip.open(os.path.join(school_name, COURSE_CODES_DAWG_OUTPUT_NAME + '.gz'), 'rt', encoding='utf-8') as f:
+        return Dawg.from_dict(json.load(f))
+
+TRIE_CACHE_SIZE = 16 # schools kept loaded by load_trie
+
+def _trie_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def _read_trie(path) -> Trie:
+    with gzip.open(path, 'rb') as f:
+        return Trie.from_dict(json.load(f))
+
+class TrieCache:
+    """Thread-safe LRU of loaded tries, keyed by school.
+
+    Every get stats the school's codes_trie.json.gz and reloads it if its
+    mtime or size changed. Concurrent gets of a school that isn't loaded
+    share a single load: the first thread reads the file and the others
+    wait for its result. Once more than maxsize schools are loaded, the
+    least recently used ones are dropped.
+    """
+
+    def __init__(self, maxsize: int = TRIE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict() # school -> (file signature, Trie), least recently used first
+        self.loading = {} # school -> (file signature, Future) of a load in progress
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, school):
+        return school in self.entries
+
+    def get(self, school_name: str) -> Trie:
+        path = os.path.join(school_name, COURSE_CODES_TRIE_OUTPUT_NAME + '.gz')
+        try:
+            signature = _trie_signature(path)
+        except FileNotFoundError:
+            self.evict(school_name)
+            raise FileNotFoundError(f"No {COURSE_CODES_TRIE_OUTPUT_NAME + '.gz'} found for {school_name}. Please run create_trie first.")
+        with self.lock:
+            entry = self.entries.get(school_name)
+            if entry is not None and entry[0] == signature:
+                self.entries.move_to_end(school_name)
+                return entry[1]
+            pending = self.loading.get(school_name)
+            owner = pending is None or pending[0] != signature
+            if owner:
+                pending = (signature, Future())
+                self.loading[school_name] = pending
+        if not owner:
+            return pending[1].result()
+
+        try:
+            trie = _read_trie(path)
+        except BaseException as e:
+            with self.lock:
+                if self.loading.get(school_name) is pending:
+                    del self.loading[school_name]
+            pending[1].set_exception(e)
+            raise
+        with self.lock:
+            if self.loading.get(school_name) is pending:
+                del self.loading[school_name]
+            self.entries[school_name] = (signature, trie)
+            self.entries.move_to_end(school_name)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        pending[1].set_result(trie)
+        return trie
+
+    def evict(self, school_name: str = None):
+        """Drop one school, or every school when none is given."""
+        with self.lock:
+            if school_name is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(school_name, None)
+
+TRIE_CACHE = TrieCache()
+
+def load_trie(school_name: str) -> Trie:
+    """The school's Trie, from TRIE_CACHE when its file hasn't changed."""
+    return TRIE_CACHE.get(school_name)
+
+class ValidationReport:
+    """Outcome of checking a school's trie against its codes.json."""
+
+    def __init__(self, school_name):
+        self.school_name = school_name
+        self.count = 0 # codes (terminal nodes) in the trie
+        self.only_in_trie = []
+        self.only_in_json = []
+        self.non_matching = [] # trie codes failing COURSE_CODE_REGEX
+        self.duplicates = [] # codes listed more than once in codes.json
+
+    @property
+    def ok(self):
+        return not (self.only_in_trie or self.only_in_json or self.non_matching or self.duplicates)
+
+    def raise_for_errors(self):
+        if self.only_in_trie or self.only_in_json:
+            print(f"Codes only in trie ({len(self.only_in_trie)}):")
+            for code in self.only_in_trie:
+                print(f"  {code}")
+            print(f"Codes only in JSON ({len(self.only_in_json)}):")
+            for code in self.only_in_json:
+                print(f"  {code}")
+            raise ValueError(f"Codes in {COURSE_CODES_SCRIPT_OUTPUT_NAME} do not match codes in trie for {self.school_name}.")
+
+        # validate course_code regex match
+        if self.non_matching:
+            print(f"Codes not matching regex {COURSE_CODE_REGEX}:")
+            for code in self.non_matching:
+                print(f"  {code}")
+            raise ValueError(f"Found {len(self.non_matching)} codes not matching regex {COURSE_CODE_REGEX}.")
+
+        # validate no duplicates
+        if self.duplicates:
+            print(f"Duplicate codes ({len(self.duplicates)}):")
+            for code in self.duplicates:
+                print(f"  {code}")
+            raise ValueError(f"Found duplicates in codes for {self.school_name}.")
+
+def check_codes(school_name: str, trie, codes_json) -> ValidationReport:
+    """Check trie codes against codes.json in one pass over each, with no sorting."""
+    report = ValidationReport(school_name)
+    expected = set()
+    for code in codes_json:
+        if code in expected:
+            report.duplicates.append(code)
+        else:
+            expected.add(code)
+
+    match = COURSE_CODE_PATTERN.match
+    for code in trie.iter_codes():
+        report.count += 1
+        if code in expected:
+            expected.remove(code)
+        else:
+            report.only_in_trie.append(code)
+        if not match(code):
+            report.non_matching.append(code)
+    # whatever was not matched off by the trie is missing from it
+    report.only_in_json = sorted(expected)
+    return report
+
 def validate_trie(school_name: str):
     path = os.path.join(school_name, COURSE_CODES_TRIE_OUTPUT_NAME + '.gz')
     if not os.path.exists(path):
         print(f"No {COURSE_CODES_TRIE_OUTPUT_NAME + '.gz'} found for {school_name}. Please run/implement {COURSE_CODES_SCRIPT_NAME} and create_trie first.")
         return
-    with gzip.open(path, 'rt', encoding='utf-8') as f:
-        trie_dict = json.load(f)
-    trie = Trie.from_dict(trie_dict)
-    codes = trie.search()
+    trie = load_trie(school_name)
 
     # first, ensure that COURSE_CODES_SCRIPT_OUTPUT_NAME is in sync with trie
     output_path = os.path.join(school_name, COURSE_CODES_SCRIPT_OUTPUT_NAME)
@@ -157,43 +1113,348 @@ def validate_trie(school_name: str):
         return
     with open(output_path, 'r', encoding='utf-8') as f:
         codes_json = json.load(f)
-    if sorted(codes) != sorted(codes_json):
-        from collections import Counter
-        codes_counter = Counter(codes)
-        codes_json_counter = Counter(codes_json)
-        only_in_trie = [code for code in codes if codes_counter[code] > codes_json_counter[code]]
-        only_in_json = [code for code in codes_json if codes_json_counter[code] > codes_counter[code]]
-        print(f"Codes only in trie ({len(only_in_trie)}):")
-        for code in only_in_trie:
-            print(f"  {code}")
-        print(f"Codes only in JSON ({len(only_in_json)}):")
-        for code in only_in_json:
-            print(f"  {code}")
-        raise ValueError(f"Codes in {COURSE_CODES_SCRIPT_OUTPUT_NAME} do not match codes in trie for {school_name}.")
-
-    # validate course_code regex match
-    non_matching = [code for code in codes if not re.match(COURSE_CODE_REGEX, code)]
-    if non_matching:
-        print(f"Codes not matching regex {COURSE_CODE_REGEX}:")
-        for code in non_matching:
-            print(f"  {code}")
-        raise ValueError(f"Found {len(non_matching)} codes not matching regex {COURSE_CODE_REGEX}.")
-    
-    # validate no duplicates
-    if len(codes) != len(set(codes)):
-        raise ValueError(f"Found duplicates in codes for {school_name}.")
-    
-    print(f"All {len(codes)} codes match the regex {COURSE_CODE_REGEX}.")
+
+    report = check_codes(school_name, trie, codes_json)
+    report.raise_for_errors()
+    print(f"All {report.count} codes match the regex {COURSE_CODE_REGEX}.")
     # print(f"Unique characters in codes for {school_name}: {sorted(set(''.join(codes)))}")
     # print([x for x in codes if '-' in x])
+    return report
 
 
-def validate_all():
-    schools = list_schools()
-    for school in schools:
-        print(f"Validating trie for {school}...")
-        validate_trie(school)
+def _run_for_school(task, school_name: str, *args):
+    # Runs in a worker process: capture the school's output so it can be
+    # printed in one piece, and report failures instead of raising them
+    output = io.StringIO()
+    start = time.perf_counter()
+    error = None
+    with contextlib.redirect_stdout(output):
+        try:
+            task(school_name, *args)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    return school_name, error, time.perf_counter() - start, output.getvalue()
+
+def _run_for_schools(task, schools, jobs, action: str, *args):
+    """Run task(school, *args) for every school, jobs at a time, and print a
+    timing summary. Returns the schools that failed with their errors."""
+    jobs = jobs or min(len(schools), os.cpu_count() or 1) or 1
+    start = time.perf_counter()
+    results = []
+    if jobs == 1:
+        outcomes = (_run_for_school(task, school, *args) for school in schools)
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        outcomes = executor.map(_run_for_school, repeat(task), schools, *(repeat(arg) for arg in args))
+    try:
+        for school, error, elapsed, output in outcomes:
+            print(f"{action} {school}...")
+            print(output, end='')
+            if error:
+                print(f"FAILED: {error}")
+            results.append((school, error, elapsed))
+    finally:
+        if jobs != 1:
+            executor.shutdown()
+    wall = time.perf_counter() - start
+
+    print(f"\nTiming ({jobs} job{'s' if jobs != 1 else ''}):")
+    for school, error, elapsed in sorted(results, key=lambda r: -r[2]):
+        print(f"  {elapsed:6.2f}s  {'FAIL' if error else 'ok  '}  {school}")
+    print(f"  {wall:6.2f}s  wall clock (sum of schools: {sum(r[2] for r in results):.2f}s)")
+
+    failures = [(school, error) for school, error, _ in results if error]
+    if failures:
+        print(f"\n{len(failures)} of {len(results)} schools failed:")
+        for school, error in failures:
+            print(f"  {school}: {error}")
+    return failures
+
+def validate_all(jobs: int = None):
+    failures = _run_for_schools(validate_trie, list_schools(), jobs, 'Validating trie for')
+    if failures:
+        raise ValueError(f"Validation failed for {len(failures)} schools.")
     print("All tries validated successfully.")
+
+def create_all_tries(fmt: str = 'trie', jobs: int = None, force: bool = False, compresslevel: int = 9):
+    schools = [
+        school for school in list_schools()
+        if os.path.exists(os.path.join(school, COURSE_CODES_SCRIPT_OUTPUT_NAME))
+    ]
+    failures = _run_for_schools(create_trie, schools, jobs, 'Creating trie for', fmt, force, compresslevel)
+    if failures:
+        raise ValueError(f"Creating tries failed for {len(failures)} schools.")
+    print("All tries are up to date.")
+
+def load_index(path: str = COURSE_CODES_INDEX_NAME) -> SchoolIndex:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return SchoolIndex.from_dict(json.load(f))
+
+def build_index(path: str = COURSE_CODES_INDEX_NAME):
+    schools = sorted(list_schools())
+    previous = load_index(path) if os.path.exists(path) else None
+    if previous is not None and set(previous.schools) <= set(schools):
+        # Keep existing bit positions and only re-read schools that changed
+        order = previous.schools + [s for s in schools if s not in previous.schools]
+        masks = previous.masks()
+        digests = previous.digests
+    else:
+        order = schools
+        masks = {}
+        digests = {}
+
+    for bit, school in enumerate(order):
+        codes_path = os.path.join(school, COURSE_CODES_SCRIPT_OUTPUT_NAME)
+        digest = _file_digest(codes_path) if os.path.exists(codes_path) else None
+        if school in digests and digests[school] == digest:
+            print(f"Unchanged: {school}")
+            continue
+        print(f"Indexing {school}...")
+        flag = 1 << bit
+        for code in [code for code, mask in masks.items() if mask & flag]:
+            masks[code] &= ~flag
+            if not masks[code]:
+                del masks[code]
+        if digest is not None:
+            with open(codes_path, 'r', encoding='utf-8') as f:
+                for code in json.load(f):
+                    masks[code] = masks.get(code, 0) | flag
+        digests[school] = digest
+
+    index = SchoolIndex(order, masks, digests)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(index.to_dict(), f, separators=(',', ':'))
+    print(f"Indexed {len(index.trie)} distinct codes across {len(order)} schools into {path}.")
+    return index
+
+def query_index(prefix: str, limit: int = 20, path: str = COURSE_CODES_INDEX_NAME):
+    if not os.path.exists(path):
+        print(f"No {path} found. Please run build-index first.")
+        return
+    index = load_index(path)
+    print(f"Schools offering codes starting with {prefix!r}: {index.schools_with_prefix(prefix)}")
+    for code, schools in index.complete(prefix, limit):
+        print(f"  {code}: {', '.join(schools)}")
+
+SERVE_RELOAD_INTERVAL = 1.0 # seconds between checks of a loaded trie's file for changes
+SERVE_MAX_LIMIT = 1000 # cap on completions returned by one request
+SERVE_MAX_EDITS = 3 # fuzzy lookups get expensive quickly past this
+SERVE_MAX_BODY = 16 * 1024 * 1024
+
+class CodeServer:
+    """Shared HTTP/1.1 lookup service over every school's codes_trie.json.gz.
+
+    Tries are loaded once per process (up front with preload, otherwise on
+    first use) in a worker thread so the event loop keeps answering other
+    schools meanwhile. A loaded trie's file is re-checked at most every
+    SERVE_RELOAD_INTERVAL seconds; a changed file is read in the background
+    and swapped in with a single dict assignment, so a request sees either
+    the old trie or the new one, never a mix. If the new file can't be read
+    (create_trie still writing it, say), the old trie keeps serving.
+
+    Connections are kept alive and requests are answered in the order they
+    arrive, so clients can pipeline several requests before reading.
+    """
+
+    def __init__(self, schools, reload_interval: float = SERVE_RELOAD_INTERVAL):
+        self.schools = set(schools)
+        self.reload_interval = reload_interval
+        # Sized to hold every school, since a server is expected to keep them all resident
+        self.cache = TrieCache(maxsize=max(1, len(self.schools)))
+        self.tries = {} # school -> Trie currently served
+        self.checked = {} # school -> time.monotonic() of the last check for a newer file
+
+    async def trie(self, school) -> Trie:
+        if school not in self.schools:
+            raise LookupError(f"Unknown school: {school}")
+        current = self.tries.get(school)
+        now = time.monotonic()
+        if current is not None and now - self.checked.get(school, 0) < self.reload_interval:
+            return current
+        self.checked[school] = now
+        # The cache stats the file and loads it at most once however many requests wait on it
+        try:
+            trie = await asyncio.get_running_loop().run_in_executor(None, self.cache.get, school)
+        except (OSError, EOFError, ValueError, zlib.error) as e:
+            if current is None:
+                raise LookupError(f"Could not load the trie for {school}: {e}")
+            print(f"Keeping the loaded trie for {school}, reloading failed: {e}")
+            return current
+        if trie is not self.tries.get(school):
+            print(f"{'Reloaded' if current is not None else 'Loaded'} trie for {school}")
+            self.tries[school] = trie
+        return trie
+
+    async def preload(self):
+        results = await asyncio.gather(*(self.trie(school) for school in sorted(self.schools)), return_exceptions=True)
+        for school, result in zip(sorted(self.schools), results):
+            if isinstance(result, Exception):
+                print(f"Not preloaded: {result}")
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.LimitOverrunError:
+                    writer.write(self._response(431, {'error': 'Request header too large'}, False))
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                    headers = {}
+                    for line in lines[1:]:
+                        if line:
+                            name, value = line.split(':', 1)
+                            headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    writer.write(self._response(400, {'error': 'Malformed request'}, False))
+                    break
+                if length > SERVE_MAX_BODY:
+                    writer.write(self._response(413, {'error': 'Request body too large'}, False))
+                    break
+                body = await reader.readexactly(length) if length else b''
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                status, payload = await self.dispatch(method, target, body)
+                writer.write(self._response(status, payload, keep_alive))
+                # Only waits when the client isn't reading its responses
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _response(status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        return head.encode('latin-1') + body
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        routes = {
+            '/schools': ('GET', self.get_schools),
+            '/contains': ('GET', self.contains),
+            '/complete': ('GET', self.complete),
+            '/fuzzy': ('GET', self.fuzzy),
+            '/validate': ('POST', self.validate),
+        }
+        if url.path not in routes:
+            return 404, {'error': f"Not found: {url.path}"}
+        allowed, handler = routes[url.path]
+        if method != allowed:
+            return 405, {'error': f"{url.path} only accepts {allowed}"}
+        try:
+            return 200, await handler(query, body)
+        except LookupError as e:
+            return 404, {'error': str(e)}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            # Answer instead of dropping the connection and every request pipelined behind this one
+            print(f"Error handling {method} {target}: {e!r}")
+            return 500, {'error': 'Internal server error'}
+
+    async def get_schools(self, query, body):
+        return {'schools': [{'school': school, 'loaded': school in self.tries} for school in sorted(self.schools)]}
+
+    async def _school(self, query):
+        if 'school' not in query:
+            raise ValueError("Missing school parameter")
+        if not isinstance(query['school'], str):
+            raise ValueError("school must be a string")
+        return query['school'], await self.trie(query['school'])
+
+    async def contains(self, query, body):
+        school, trie = await self._school(query)
+        if 'code' not in query:
+            raise ValueError("Missing code parameter")
+        return {'school': school, 'code': query['code'], 'contains': trie.contains(query['code'])}
+
+    async def complete(self, query, body):
+        school, trie = await self._school(query)
+        prefix = query.get('prefix', '')
+        try:
+            limit = min(int(query.get('limit', 20)), SERVE_MAX_LIMIT)
+            offset = int(query.get('offset', 0))
+        except ValueError:
+            raise ValueError("limit and offset must be integers")
+        if limit < 0 or offset < 0:
+            raise ValueError("limit and offset must not be negative")
+        return {
+            'school': school,
+            'prefix': prefix,
+            'count': trie.count(prefix),
+            'completions': trie.complete(prefix, limit, offset),
+        }
+
+    async def fuzzy(self, query, body):
+        school, trie = await self._school(query)
+        if 'query' not in query:
+            raise ValueError("Missing query parameter")
+        try:
+            max_edits = int(query.get('max_edits', 1))
+            limit = min(int(query.get('limit', 20)), SERVE_MAX_LIMIT)
+        except ValueError:
+            raise ValueError("max_edits and limit must be integers")
+        if not 0 <= max_edits <= SERVE_MAX_EDITS or limit < 0:
+            raise ValueError(f"max_edits must be 0 to {SERVE_MAX_EDITS} and limit not negative")
+        matches = trie.fuzzy_search(query['query'], max_edits, limit)
+        return {
+            'school': school,
+            'query': query['query'],
+            'matches': [{'code': code, 'distance': distance} for code, distance in matches],
+        }
+
+    async def validate(self, query, body):
+        """Body is a JSON list of codes, or {"school": ..., "codes": [...]}."""
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            raise ValueError("Body must be JSON")
+        if isinstance(data, dict):
+            query = {**query, **({'school': data['school']} if 'school' in data else {})}
+            data = data.get('codes')
+        if not isinstance(data, list) or not all(isinstance(code, str) for code in data):
+            raise ValueError("Expected a JSON list of code strings")
+        school, trie = await self._school(query)
+        contains = trie.contains
+        results = [contains(code) for code in data]
+        return {
+            'school': school,
+            'results': results,
+            'invalid': [code for code, ok in zip(data, results) if not ok],
+        }
+
+async def _serve(host: str, port: int, preload: bool):
+    server = CodeServer(list_schools())
+    if preload:
+        await server.preload()
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving {len(server.schools)} schools on http://{host}:{port} (Ctrl+C to stop)")
+    async with listener:
+        await listener.serve_forever()
+
+def serve(host: str = '127.0.0.1', port: int = 8000, preload: bool = False):
+    try:
+        asyncio.run(_serve(host, port, preload))
+    except KeyboardInterrupt:
+        print("Stopped.")
+
 # python main.py list-schools 
 # python main.py create-school "New School"
 # python main.py create-trie "New School"
@@ -208,26 +1469,73 @@ def main():
     create_school_parser = subparsers.add_parser('create-school', help='Create a new school.')
     create_school_parser.add_argument('school_name', type=str, help='Name of the school to create.')
 
+    get_codes_parser = subparsers.add_parser('get-codes', help="Run a school's get_codes.py scraper to produce codes.json.")
+    get_codes_parser.add_argument('school_name', type=str, nargs='?', help='Name of the school to get codes for.')
+    get_codes_parser.add_argument('--all', action='store_true', help='Get codes for every school, concurrently.')
+    get_codes_parser.add_argument('--jobs', type=int, default=None, help='Number of schools to scrape at once with --all (default: all of them).')
+    get_codes_parser.add_argument('--no-cache', dest='cache', action='store_false', help='Do not read or write the HTTP response cache.')
+    get_codes_parser.add_argument('--offline', action='store_true', help='Replay cached responses only, without using the network.')
+
     create_trie_parser = subparsers.add_parser('create-trie', help='Create trie for a school.')
-    create_trie_parser.add_argument('school_name', type=str, help='Name of the school to create trie for.')
+    create_trie_parser.add_argument('school_name', type=str, nargs='?', help='Name of the school to create trie for.')
+    create_trie_parser.add_argument('--format', choices=TRIE_FORMATS, default='trie', help='Output format: nested-dict trie or minimized DAWG.')
+    create_trie_parser.add_argument('--all', action='store_true', help='Create tries for every school whose codes changed.')
+    create_trie_parser.add_argument('--jobs', type=int, default=None, help='Number of schools to build in parallel with --all (default: one per CPU).')
+    create_trie_parser.add_argument('--force', action='store_true', help='Rebuild even if the inputs are unchanged.')
+    create_trie_parser.add_argument('--compresslevel', type=int, choices=range(10), default=9, metavar='0-9', help='gzip compression level for the .gz output.')
 
     validate_trie_parser = subparsers.add_parser('validate-trie', help='Validate trie for a school.')
     validate_trie_parser.add_argument('school_name', type=str, help='Name of the school to validate trie for.')
 
-    subparsers.add_parser('validate-all', help='Validate tries for all schools.')
+    validate_all_parser = subparsers.add_parser('validate-all', help='Validate tries for all schools.')
+    validate_all_parser.add_argument('--jobs', type=int, default=None, help='Number of schools to validate in parallel (default: one per CPU).')
+
+    subparsers.add_parser('build-index', help='Build or update the cross-school code index.')
+
+    query_index_parser = subparsers.add_parser('query-index', help='Look up a code prefix across all schools.')
+    query_index_parser.add_argument('prefix', type=str, help='Code or code prefix to look up.')
+    query_index_parser.add_argument('--limit', type=int, default=20, help='Maximum number of matching codes to list.')
+
+    scrape_report_parser = subparsers.add_parser('scrape-report', help="Show the last get-codes run's timing and throughput.")
+    scrape_report_parser.add_argument('school_name', type=str, nargs='?', help='School to show (default: every school with a report).')
+
+    serve_parser = subparsers.add_parser('serve', help='Serve code lookups for every school over HTTP.')
+    serve_parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on.')
+    serve_parser.add_argument('--port', type=int, default=8000, help='Port to listen on.')
+    serve_parser.add_argument('--preload', action='store_true', help='Load every school at startup instead of on first use.')
 
     args = parser.parse_args()
     if args.command == 'create-school':
         create_school(args.school_name)
+    elif args.command == 'get-codes':
+        if args.all:
+            get_codes_all(args.jobs, args.cache, args.offline)
+        elif args.school_name:
+            get_codes(args.school_name, args.cache, args.offline)
+        else:
+            get_codes_parser.error('a school name or --all is required')
     elif args.command == 'create-trie':
-        create_trie(args.school_name)
+        if args.all:
+            create_all_tries(args.format, args.jobs, args.force, args.compresslevel)
+        elif args.school_name:
+            create_trie(args.school_name, args.format, args.force, args.compresslevel)
+        else:
+            create_trie_parser.error('a school name or --all is required')
     elif args.command == 'validate-trie':
         validate_trie(args.school_name)
     elif args.command == 'list-schools':
         schools = list_schools()
         print(json.dumps(schools, indent=4))
     elif args.command == 'validate-all':
-        validate_all()
+        validate_all(args.jobs)
+    elif args.command == 'build-index':
+        build_index()
+    elif args.command == 'query-index':
+        query_index(args.prefix, args.limit)
+    elif args.command == 'scrape-report':
+        scrape_report([args.school_name] if args.school_name else list_schools())
+    elif args.command == 'serve':
+        serve(args.host, args.port, args.preload)
     elif args.command == 'cleanup':
         cleanup()
     else:
@@ -0,0 +1,9 @@
+"""Shared toolkit for the per-school get_codes.py scrapers."""
+from .accumulate import Accumulator
+from .base import SCRAPERS, EndOfData, SchoolScraper, load_scraper, register, run_schools
+from .cache import CacheMiss, ResponseCache
+from .fetch import DEFAULT_HEADERS, CircuitOpen, Fetcher, Request
+from .jsonstream import iter_json
+from .markup import Document
+from .normalize import Normalizer, Sub, Translate
+from .telemetry import Telemetry
@@ -0,0 +1,106 @@
+"""Deduplicating accumulator for scrape results, checkpointed to a journal.
+
+Results are appended to a list (amortized O(1)) with a set alongside to drop
+duplicates as they arrive. Each ``add`` also appends one JSON line with the
+new items to an append-only journal, so a checkpoint costs only the size of
+what was added rather than a rewrite of everything so far, and a crashed
+run can pick the journal back up.
+
+An ``add`` can also mark a unit of work (a URL, a page, a term/campus
+combination) as done in the same line as its results, so on resume a
+scraper knows exactly which units to skip and never loses the results of
+one it skips.
+"""
+import json
+import os
+import threading
+
+
+def _hashable(item):
+    # JSON turns tuples into lists; turn them back so they can be deduplicated
+    return tuple(_hashable(x) for x in item) if isinstance(item, list) else item
+
+
+class Accumulator:
+    """Ordered, duplicate-free collection of scraped items.
+
+    Items must be hashable and JSON-serializable (strings, numbers, tuples),
+    and units strings. With ``journal``, existing journal lines are loaded
+    back first (when ``resume``) and every later ``add`` is appended to it.
+    """
+
+    def __init__(self, journal=None, resume=True):
+        self.items = []
+        self.done = set() # units of work completed
+        self._seen = set()
+        self._lock = threading.Lock() # scrapers may add from several threads
+        self.journal = journal
+        self._file = None
+        if journal is None:
+            return
+        if resume and os.path.exists(journal):
+            with open(journal, 'rb+') as f:
+                good = 0
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    good += len(line)
+                    self._extend(_hashable(item) for item in record['items'])
+                    if 'unit' in record:
+                        self.done.add(record['unit'])
+                # Cut off a line left incomplete by a crash before appending
+                f.truncate(good)
+        self._file = open(journal, 'a' if resume else 'w', encoding='utf-8')
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _extend(self, items):
+        new = []
+        for item in items:
+            if item not in self._seen:
+                self._seen.add(item)
+                new.append(item)
+        self.items.extend(new)
+        return new
+
+    def add(self, items, unit=None):
+        """Add items, skipping ones already seen, and mark ``unit`` as done if
+        given. Returns the newly added items."""
+        with self._lock:
+            new = self._extend(items)
+            record = {'items': new}
+            if unit is not None:
+                self.done.add(unit)
+                record['unit'] = unit
+            if (new or unit is not None) and self._file is not None:
+                self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                self._file.flush()
+        return new
+
+    def is_done(self, unit):
+        return unit in self.done
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Close and delete the journal, e.g. once the final output is written."""
+        self.close()
+        if self.journal is not None and os.path.exists(self.journal):
+            os.remove(self.journal)
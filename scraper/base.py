@@ -0,0 +1,250 @@
+"""SchoolScraper base class and the registry of school scrapers.
+
+A school's get_codes.py subclasses SchoolScraper, declares how to fetch
+(``plan``) and how to read codes out of each response (``parse``), and
+registers itself with ``@register``. The base class owns the Fetcher,
+batching, the results journal, normalization and writing codes.json, so
+scrapers can be imported, tested and run side by side from one process.
+"""
+import importlib.util
+import json
+import os
+import re
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from .accumulate import Accumulator
+from .cache import ResponseCache
+from .fetch import Fetcher
+from .normalize import Normalizer
+from .telemetry import Telemetry
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_NAME = 'get_codes.py'
+OUTPUT_NAME = 'codes.json'
+JOURNAL_NAME = 'codes.journal.jsonl' # raw results of an unfinished run
+REPORT_NAME = 'scrape_report.json' # metrics of the last run
+CACHE_DIR = '.http_cache' # under the repo root, shared by every school
+
+SCRAPERS = {} # school name -> SchoolScraper subclass
+
+
+def register(cls):
+    """Class decorator adding a SchoolScraper subclass to SCRAPERS."""
+    if not cls.school:
+        raise ValueError(f'{cls.__name__} must set school')
+    SCRAPERS[cls.school] = cls
+    return cls
+
+
+class EndOfData(Exception):
+    """Raised by parse() when a response shows there is nothing more to fetch."""
+
+
+class SchoolScraper:
+    """Base class for one school's course code scraper.
+
+    Subclasses set ``school`` (the school's directory name) and implement
+    ``plan`` and ``parse``. Scrapers whose requests depend on each other can
+    override ``scrape`` instead. ``rules`` lists the Translate/Sub steps that
+    clean up each code before dedup and the COURSE_CODE_REGEX check.
+    """
+    school = None
+    rules = ()
+    max_workers = 8 # requests in flight at once, across all hosts
+    per_host = 4 # requests in flight at once to one host
+    delay = 0.1 # seconds between request starts to one host
+
+    def __init__(self, output_dir=None, cache=True):
+        # cache is a ResponseCache, True for the default one, or None/False
+        self.output_dir = output_dir or os.path.join(REPO_ROOT, self.school)
+        self.cache = ResponseCache(os.path.join(REPO_ROOT, CACHE_DIR)) if cache is True else cache or None
+        self.fetcher = None
+        self.results = None # Accumulator for the current run
+        self.failures = [] # (unit, error) for units that failed in this run
+        self.telemetry = None # Telemetry for the current run
+
+    def log(self, message):
+        print(f'[{self.school}] {message}')
+
+    def failed(self, unit, error):
+        """Record a unit of work that failed; the run carries on without it."""
+        error = f'{type(error).__name__}: {error}' if isinstance(error, BaseException) else error
+        self.failures.append((unit, error))
+        self.log(f'{unit}: FAILED: {error}')
+
+    @classmethod
+    def implemented(cls):
+        """Whether the subclass overrides plan or scrape yet; the create-school
+        skeleton doesn't, so get-codes --all can skip it."""
+        return cls.plan is not SchoolScraper.plan or cls.scrape is not SchoolScraper.scrape
+
+    def plan(self):
+        """Yield the Requests to fetch. May be lazy and unbounded if parse
+        raises EndOfData once the data runs out."""
+        raise NotImplementedError
+
+    def parse(self, response, request):
+        """Return the codes found in one response."""
+        raise NotImplementedError
+
+    def normalize(self, codes):
+        """Turn everything parse returned into the final list of codes.
+
+        Applies ``rules``, dedups and drops codes failing COURSE_CODE_REGEX.
+        Override to reshape parse's results first, then call this.
+        """
+        normalizer = Normalizer(self.rules)
+        codes = normalizer.run(codes)
+        if self.telemetry is not None:
+            self.telemetry.normalized(normalizer.rejected, normalizer.duplicates)
+        if normalizer.rejected:
+            self.log(f'Rejected {len(normalizer.rejected)} codes not matching COURSE_CODE_REGEX, e.g. {normalizer.rejected[:5]}')
+        return codes
+
+    def pending(self, requests):
+        """Drop requests whose unit is already done in a resumed run."""
+        skipped = 0
+        for request in requests:
+            if self.results.is_done(request.unit):
+                skipped += 1
+                continue
+            if skipped:
+                self.log(f'Skipped {skipped} requests finished in an earlier run')
+                skipped = 0
+            yield request
+        if skipped:
+            self.log(f'Skipped {skipped} requests finished in an earlier run')
+
+    def scrape(self):
+        """Fetch and parse everything into self.results."""
+        # Submit the plan one batch at a time so an unbounded plan stops
+        # soon after parse raises EndOfData
+        requests = self.pending(self.plan())
+        failed_in_a_row = 0
+        while True:
+            # A whole batch's worth of failures in a row means the server is
+            # refusing us (or the plan is wrong); stop rather than work
+            # through the rest of a possibly open-ended plan. The failures
+            # make run() report the scrape as failed, and a re-run resumes.
+            if failed_in_a_row >= self.max_workers:
+                self.log(f'{failed_in_a_row} units failed in a row, stopping.')
+                return
+            batch = list(islice(requests, self.max_workers))
+            if not batch:
+                return
+            for request, response in zip(batch, self.fetcher.map(batch, return_exceptions=True)):
+                if isinstance(response, Exception):
+                    self.failed(request, response)
+                    failed_in_a_row += 1
+                    continue
+                start = time.perf_counter()
+                try:
+                    found = list(self.parse(response, request))
+                except EndOfData as e:
+                    self.log(f'{request}: {e or "no more data"}, stopping.')
+                    return
+                except Exception as e:
+                    self.failed(request, e)
+                    failed_in_a_row += 1
+                    continue
+                failed_in_a_row = 0
+                new = self.results.add(found, request.unit)
+                self.telemetry.parsed(request.unit, time.perf_counter() - start, len(found), len(new))
+                self.log(f'{request}: {len(found)} codes ({len(new)} new), {len(self.results)} so far')
+
+    def write(self, codes):
+        with open(os.path.join(self.output_dir, OUTPUT_NAME), 'w', encoding='utf-8') as f:
+            json.dump(codes, f, indent=4, ensure_ascii=False)
+
+    def run(self):
+        """Scrape, normalize and write codes.json. Returns the codes.
+
+        Results are journaled as they come in, along with which units of work
+        are finished; if the run dies, the next one picks up the results and
+        skips the finished units. The journal is deleted once codes.json has
+        been written.
+
+        Units that fail are summarized at the end and the run raises instead
+        of writing incomplete codes; re-running retries just those units.
+        Either way the run's metrics go to scrape_report.json.
+        """
+        self.results = Accumulator(os.path.join(self.output_dir, JOURNAL_NAME))
+        self.failures = []
+        self.telemetry = Telemetry(self.school)
+        if len(self.results) or self.results.done:
+            self.log(f'Resuming with {len(self.results)} results and {len(self.results.done)} finished units from {JOURNAL_NAME}')
+        try:
+            with Fetcher(max_workers=self.max_workers, per_host=self.per_host, delay=self.delay,
+                         cache=self.cache, telemetry=self.telemetry) as fetcher:
+                self.fetcher = fetcher
+                try:
+                    self.scrape()
+                finally:
+                    self.fetcher = None
+            if fetcher.retried:
+                self.log(f'{fetcher.retried} retried attempts, {len(fetcher.failures)} requests failed outright')
+            if self.failures:
+                self.log(f'{len(self.failures)} units failed:')
+                for unit, error in self.failures:
+                    self.log(f'  {unit}: {error}')
+                raise ValueError(
+                    f'{len(self.failures)} units failed; {len(self.results.done)} finished units are kept '
+                    f'in {JOURNAL_NAME}, re-run to retry the rest'
+                )
+            codes = self.normalize(self.results.items)
+            self.write(codes)
+        except BaseException:
+            self.results.close()
+            raise
+        finally:
+            self.report()
+        self.results.discard()
+        self.log(f'Saved {len(codes)} codes to {OUTPUT_NAME}')
+        return codes
+
+    def report(self):
+        self.telemetry.finish()
+        summary = self.telemetry.write(os.path.join(self.output_dir, REPORT_NAME))['summary']
+        latency = summary['latency']
+        if latency['count']:
+            self.log(
+                f"{summary['requests']} requests ({summary['cached']} cached) in {summary['wall_seconds']:.1f}s, "
+                f"latency p50 {latency['p50']:.3f}s p95 {latency['p95']:.3f}s "
+                f"(waiting p95 {summary['wait']['p95']:.3f}s), "
+                f"{summary['bytes'] / 1e6:.1f} MB, {summary['retries']} retries"
+            )
+
+
+def load_scraper(school, root=REPO_ROOT):
+    """Import a school's get_codes.py and return its registered scraper class."""
+    if school not in SCRAPERS:
+        path = os.path.join(root, school, SCRIPT_NAME)
+        module_name = 'school_scrapers.' + re.sub(r'\W+', '_', school)
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    if school not in SCRAPERS:
+        raise LookupError(f'{SCRIPT_NAME} for {school} does not register a SchoolScraper')
+    return SCRAPERS[school]
+
+
+def run_schools(schools, jobs=None, root=REPO_ROOT, cache=True, offline=False):
+    """Run several schools' scrapers concurrently. Returns {school: error or None}.
+
+    With cache, responses are kept in CACHE_DIR under root; offline replays
+    them without using the network.
+    """
+    cache = ResponseCache(os.path.join(root, CACHE_DIR), offline=offline) if cache or offline else None
+
+    def run(school):
+        try:
+            load_scraper(school, root)(os.path.join(root, school), cache).run()
+        except Exception as e:
+            print(f'[{school}] FAILED: {type(e).__name__}: {e}')
+            return f'{type(e).__name__}: {e}'
+
+    with ThreadPoolExecutor(max_workers=jobs or len(schools) or 1) as executor:
+        return dict(zip(schools, executor.map(run, schools)))
@@ -0,0 +1,115 @@
+"""On-disk HTTP response cache for the scrapers.
+
+Responses are stored under a key derived from the method, the full URL
+(query string included) and the request body. Cached GETs are revalidated
+with If-None-Match / If-Modified-Since so unchanged pages come back as a
+bodyless 304, and offline mode replays everything from disk without
+touching the network, which is handy for re-testing parsers.
+"""
+import json
+import os
+import time
+import uuid
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode for a request that has no cached response."""
+
+
+class ResponseCache:
+    """Cache of successful responses, one ``<key>.json`` + ``<key>.body`` pair each.
+
+    ``max_age`` (seconds) lets fresh entries be served without a request at
+    all; by default every cached GET is revalidated with the server.
+    """
+
+    def __init__(self, directory, offline=False, max_age=None):
+        self.directory = directory
+        self.offline = offline
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(request):
+        return request.fingerprint()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    @staticmethod
+    def _replace(path, mode, write):
+        # Unique temp name so concurrent fetches of the same URL don't collide
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, mode) as f:
+            write(f)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        """Return the cached entry's metadata, or None."""
+        try:
+            with open(self._path(key, '.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def is_fresh(self, entry):
+        return self.max_age is not None and time.time() - entry['stored_at'] < self.max_age
+
+    @staticmethod
+    def validators(entry):
+        """Conditional request headers for revalidating an entry."""
+        headers = {}
+        if entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def store(self, key, response):
+        # response.content is already decoded, so drop the transfer headers
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')
+        }
+        entry = {
+            'method': response.request.method,
+            'url': response.url,
+            'status_code': response.status_code,
+            'headers': headers,
+            'stored_at': time.time(),
+        }
+        os.makedirs(os.path.dirname(self._path(key, '')), exist_ok=True)
+        # Write the body first and the metadata last, each via rename, so a
+        # reader never sees metadata pointing at a partial body. The body is
+        # copied in chunks so streamed responses are never held in memory.
+        self._replace(self._path(key, '.body'), 'wb', lambda f: f.writelines(response.iter_content(65536)))
+        self._replace(self._path(key, '.json'), 'w', lambda f: json.dump(entry, f))
+        return entry
+
+    def touch(self, key, entry):
+        """Mark an entry as revalidated now."""
+        entry['stored_at'] = time.time()
+        self._replace(self._path(key, '.json'), 'w', lambda f: json.dump(entry, f))
+
+    def response(self, key, entry, stream=False):
+        """Rebuild a requests.Response from a cached entry.
+
+        With stream the body is read lazily from the cache file, like a
+        streamed network response.
+        """
+        response = requests.Response()
+        response.status_code = entry['status_code']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.url = entry['url']
+        response.encoding = get_encoding_from_headers(response.headers)
+        if stream:
+            response.raw = open(self._path(key, '.body'), 'rb')
+        else:
+            with open(self._path(key, '.body'), 'rb') as f:
+                response._content = f.read()
+        response.from_cache = True
+        return response
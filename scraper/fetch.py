@@ -0,0 +1,383 @@
+"""Concurrent HTTP fetching shared by the school scrapers.
+
+Requests run on a bounded thread pool. Each worker thread keeps its own
+pooled ``requests.Session`` (all sharing one cookie jar), and every host
+gets a cap on in-flight requests plus a minimum delay between request
+starts so batches stay polite to the catalog servers.
+
+Failed attempts (connection errors, timeouts and retryable statuses such as
+429 and 503) are retried with exponential backoff and full jitter. A
+``Retry-After`` header, or a run of consecutive failures tripping the host's
+circuit breaker, pauses every request to that host rather than just the
+one that failed, and a host whose breaker keeps tripping fails fast with
+``CircuitOpen`` instead of being hammered further.
+"""
+import hashlib
+import random
+import threading
+import time
+
+from email.utils import parsedate_to_datetime
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .cache import CacheMiss
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+# Statuses worth another attempt; anything else is returned to the caller
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Errors that may go away on their own, unlike e.g. InvalidURL
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class CircuitOpen(requests.RequestException):
+    """Raised instead of sending a request to a host that keeps failing."""
+
+
+def _retry_after(response):
+    """Seconds asked for by a Retry-After header (delta or HTTP date), or None."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _copy_timing(response, cached):
+    # A response answered from the cache after a network round trip keeps its timings
+    for name in ('attempts', 'latency', 'waited'):
+        setattr(cached, name, getattr(response, name, None))
+
+
+class Request:
+    """One HTTP request to submit to a Fetcher.
+
+    With ``stream`` the body is left unread for the caller to consume
+    incrementally (see ``iter_json``). ``unit`` names the request in a
+    scraper's resume journal; it defaults to the request's fingerprint.
+    """
+
+    def __init__(self, method, url, params=None, data=None, headers=None, stream=False, unit=None):
+        self.method = method.upper()
+        self.url = url
+        self.params = params
+        self.data = data
+        self.headers = headers
+        self.stream = stream
+        self.unit = unit or self.fingerprint()
+
+    @property
+    def host(self):
+        return urlparse(self.url).netloc
+
+    def fingerprint(self):
+        """SHA-256 of the method, full URL (with params) and body."""
+        prepared = requests.Request(self.method, self.url, params=self.params, data=self.data).prepare()
+        body = prepared.body or b''
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        digest = hashlib.sha256()
+        digest.update(prepared.method.encode('ascii') + b' ' + prepared.url.encode('utf-8') + b'\n')
+        digest.update(body)
+        return digest.hexdigest()
+
+    def __repr__(self):
+        return f'Request({self.method} {self.url})'
+
+
+class _Host:
+    """Concurrency slots, politeness clock and circuit breaker for one host."""
+
+    def __init__(self, limit, delay):
+        self.slots = threading.BoundedSemaphore(limit)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+        self.failures = 0 # consecutive failed attempts
+        self.trips = 0 # consecutive times the breaker opened without a success since
+        self.open_for = 0.0 # cooldown of the last trip
+        self.reopen_at = 0.0 # time.monotonic() at which an open breaker lets a probe through
+        self.probing = False # a probe request is out; its failure reopens the breaker at once
+
+    def pause(self, seconds):
+        """Hold back every request to this host for at least ``seconds``."""
+        with self.lock:
+            self.next_start = max(self.next_start, time.monotonic() + seconds)
+
+    def admit(self, max_trips):
+        """Whether a request may be sent. After ``max_trips`` trips the
+        breaker stays open, refusing requests, until its cooldown is over;
+        then it lets one probe through (half-open) and refuses the rest
+        until the probe succeeds or fails. A probe that never reports back
+        is replaced by another one after a further cooldown."""
+        with self.lock:
+            if self.trips < max_trips:
+                return True
+            now = time.monotonic()
+            if now < self.reopen_at:
+                return False
+            self.reopen_at = now + self.open_for
+            self.probing = True
+            return True
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+            self.trips = 0
+            self.probing = False
+
+    def failed(self, threshold, cooldown):
+        """Count a failed attempt; open the breaker (pause the host) after
+        ``threshold`` in a row, or at once for a failed probe. Returns True
+        if the breaker opened."""
+        with self.lock:
+            self.failures += 1
+            if self.failures < threshold and not self.probing:
+                return False
+            self.failures = 0
+            self.probing = False
+            self.trips += 1
+            # Each trip without a success in between doubles the cooldown
+            self.open_for = cooldown * 2 ** (self.trips - 1)
+            self.reopen_at = time.monotonic() + self.open_for
+            self.next_start = max(self.next_start, self.reopen_at)
+            return True
+
+    def wait_turn(self):
+        # Reserve the next start time under the lock, then sleep outside it
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+
+class Fetcher:
+    """Thread-pool HTTP client with per-host concurrency limits and delays.
+
+    Use ``fetch`` for a single blocking request and ``map`` to submit a batch;
+    ``map`` yields responses in the order the requests were given.
+
+    ``retries`` is the number of attempts per request; the wait before
+    attempt n is random up to ``backoff * 2**(n-2)``, capped at
+    ``max_backoff``. After ``breaker_threshold`` consecutive failures
+    against a host its breaker opens for ``breaker_cooldown`` seconds
+    (doubling on each trip without a success), and after ``breaker_trips``
+    trips requests to it raise CircuitOpen, except for one probe per
+    cooldown whose success closes the breaker again. Error statuses that
+    aren't retried (a 403, say) are returned but still count as failures
+    toward the breaker. Retry-After waits
+    are capped at ``max_backoff``. ``failures`` collects every request
+    that finally failed, for the caller's summary.
+    """
+
+    def __init__(self, max_workers=8, per_host=4, delay=0.0, headers=None, timeout=30,
+                 retries=5, backoff=0.5, max_backoff=60, breaker_threshold=5, breaker_cooldown=10,
+                 breaker_trips=3, cache=None, telemetry=None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.delay = delay
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.breaker_trips = breaker_trips
+        self.cache = cache # optional ResponseCache
+        self.telemetry = telemetry # optional Telemetry
+        self.failures = [] # (request, error) for requests that failed every attempt
+        self.retried = 0 # attempts beyond the first, across all requests
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+        self._local = threading.local()
+        self._sessions = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for session in self._sessions:
+            session.close()
+
+    @property
+    def session(self):
+        """The calling thread's session, created on first use."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.new_session(self.cookies)
+        return session
+
+    def new_session(self, cookies=None):
+        """A session with the fetcher's headers and pooling, and its own
+        cookie jar unless one is given. Pass it to ``fetch`` for requests
+        that must not share server-side state with the others."""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        if cookies is not None:
+            session.cookies = cookies
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.per_host)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        with self._hosts_lock:
+            self._sessions.append(session)
+        return session
+
+    def _host(self, host):
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = _Host(self.per_host, self.delay)
+            return self._hosts[host]
+
+    def fetch(self, request, url=None, session=None, **kwargs):
+        """Send one request and return its response.
+
+        Accepts either a Request or the same arguments as Request, and
+        optionally a session from ``new_session`` to send it on. Raises
+        the last error if every attempt fails (an HTTPError for a status
+        that stayed retryable), or CircuitOpen. With a cache, GETs are
+        revalidated and answered from disk when unchanged, and offline
+        caches never touch the network.
+        """
+        if not isinstance(request, Request):
+            request = Request(request, url, **kwargs)
+        start = time.perf_counter()
+        response = self._fetch(request, session)
+        if self.telemetry is not None:
+            self.telemetry.request(request, response, time.perf_counter() - start)
+        return response
+
+    def _fetch(self, request, session):
+        if self.cache is None:
+            return self._send(request, request.headers, session)
+
+        key = self.cache.key(request)
+        entry = self.cache.get(key)
+        if entry is not None and (self.cache.offline or self.cache.is_fresh(entry)):
+            return self.cache.response(key, entry, request.stream)
+        if self.cache.offline:
+            raise CacheMiss(f'{request} is not cached')
+        headers = request.headers
+        if entry is not None and request.method == 'GET':
+            headers = {**(headers or {}), **self.cache.validators(entry)}
+        response = self._send(request, headers, session)
+        if entry is not None and response.status_code == 304:
+            self.cache.touch(key, entry)
+            cached = self.cache.response(key, entry, request.stream)
+            _copy_timing(response, cached)
+            return cached
+        if response.status_code == 200:
+            entry = self.cache.store(key, response)
+            if request.stream:
+                # The body went to disk in chunks; hand back a reader over it
+                cached = self.cache.response(key, entry, stream=True)
+                _copy_timing(response, cached)
+                return cached
+        return response
+
+    def _send(self, request, headers, session=None):
+        try:
+            return self._attempts(request, headers, session)
+        except requests.RequestException as e:
+            with self._hosts_lock:
+                self.failures.append((request, f'{type(e).__name__}: {e}'))
+            if self.telemetry is not None:
+                self.telemetry.failed(request, f'{type(e).__name__}: {e}', getattr(e, 'attempts', 0))
+            raise
+
+    def _attempts(self, request, headers, session):
+        host = self._host(request.host)
+        started = time.perf_counter()
+        network = 0.0 # time spent in session.request, across attempts
+        for attempt in range(1, self.retries + 1):
+            if not host.admit(self.breaker_trips):
+                raise CircuitOpen(f'{request.host} failed too often, not sending {request}')
+            if attempt > 1:
+                with self._hosts_lock:
+                    self.retried += 1
+            wait = None
+            with host.slots:
+                host.wait_turn()
+                sent = time.perf_counter()
+                try:
+                    response = (session or self.session).request(
+                        request.method, request.url,
+                        params=request.params, data=request.data, headers=headers,
+                        timeout=self.timeout, stream=request.stream,
+                    )
+                except TRANSIENT_ERRORS as e:
+                    network += time.perf_counter() - sent
+                    if attempt == self.retries:
+                        host.failed(self.breaker_threshold, self.breaker_cooldown)
+                        e.attempts = attempt
+                        raise
+                    problem = f'{type(e).__name__}: {e}'
+                else:
+                    response.latency = time.perf_counter() - sent
+                    network += response.latency
+                    response.attempts = attempt
+                    if response.status_code not in RETRY_STATUSES:
+                        if response.status_code < 400:
+                            host.succeeded()
+                        elif host.failed(self.breaker_threshold, self.breaker_cooldown):
+                            # A 403 from a firewall or a 400 on a bad query won't clear on
+                            # retry, but a host answering nothing else still trips the breaker
+                            print(f'{request.host}: {self.breaker_threshold} failures in a row, pausing the host')
+                        # Queueing for a slot, the politeness delay and backoff sleeps
+                        response.waited = time.perf_counter() - started - network
+                        return response
+                    if attempt == self.retries:
+                        host.failed(self.breaker_threshold, self.breaker_cooldown)
+                        try:
+                            response.raise_for_status()
+                        except requests.HTTPError as e:
+                            e.attempts = attempt
+                            raise
+                    problem = f'status {response.status_code}'
+                    wait = _retry_after(response)
+                    response.close()
+            if host.failed(self.breaker_threshold, self.breaker_cooldown):
+                print(f'{request.host}: {self.breaker_threshold} failures in a row, pausing the host')
+            if wait is not None:
+                # The server said how long to back off; make the whole host
+                # wait, but no longer than our own longest backoff
+                wait = min(wait, self.max_backoff)
+                host.pause(wait)
+            else:
+                wait = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+            print(f'{request}: {problem}, retrying ({attempt + 1}/{self.retries}) in {wait:.1f}s')
+            time.sleep(wait)
+
+    def map(self, batch, return_exceptions=False):
+        """Fetch a batch of requests concurrently, yielding responses in order.
+
+        With ``return_exceptions`` a request that fails yields its exception
+        instead of stopping the iteration.
+        """
+        if not return_exceptions:
+            return self._executor.map(self.fetch, list(batch))
+        futures = [self._executor.submit(self.fetch, request) for request in batch]
+        return (future.exception() or future.result() for future in futures)
@@ -0,0 +1,182 @@
+"""Streaming extraction from large JSON responses.
+
+``iter_json`` walks a response body chunk by chunk and yields only the
+values under one path, e.g. every element of ``data.results``, without ever
+holding the whole document. Each yielded value is decoded on its own with
+the C-accelerated ``json`` decoder, and everything off the path is skipped
+by scanning rather than decoding, so memory stays bounded by the largest
+single element instead of the payload.
+
+Send the request with ``Request(..., stream=True)`` so the body isn't read
+into memory before parsing starts.
+"""
+import codecs
+import json
+import re
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_NUMBER_TAIL = '.eE+-0123456789' # characters that can continue a number ('' is in it too)
+
+
+class _Reader:
+    """Text buffer over an iterator of byte chunks, refilled on demand."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another chunk into the buffer. Returns False at the end of the input."""
+        if self.eof:
+            return False
+        if self.pos > 65536:
+            # Drop what has been consumed so the buffer doesn't grow with the document
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        for chunk in self.chunks:
+            text = self.decoder.decode(chunk)
+            if text:
+                self.buffer += text
+                return True
+        self.buffer += self.decoder.decode(b'', final=True)
+        self.eof = True
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character, or '' at the end."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if char == '' or char not in chars:
+            raise ValueError(f'Expected one of {chars!r} at offset {self.pos}, got {char!r}')
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.more():
+                    continue
+                raise
+            # A number cut by the end of the buffer may continue in the next
+            # chunk, even when it decoded: "1." and "2e" stop before the cut
+            if (isinstance(value, (int, float)) and not isinstance(value, bool) and not self.eof
+                    and self.buffer[end:end + 1] in _NUMBER_TAIL and self.more()):
+                continue
+            self.pos = end
+            return value
+
+    def more(self):
+        # Double the unread text before retrying, so a value spanning many
+        # chunks is re-decoded a logarithmic number of times
+        target = 2 * (len(self.buffer) - self.pos) + 1
+        filled = False
+        while len(self.buffer) - self.pos < target and self.fill():
+            filled = True
+        return filled
+
+    def skip(self):
+        """Step over the next value without building it."""
+        if self.peek() not in '[{':
+            self.value()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self.fill():
+                    raise ValueError('Unexpected end of JSON input')
+                continue
+            char = match.group()
+            if char == '"':
+                string = _STRING.match(self.buffer, match.start())
+                if string is None:
+                    # Unterminated so far: keep the position and read more
+                    self.pos = match.start()
+                    if not self.fill():
+                        raise ValueError('Unterminated string in JSON input')
+                    continue
+                self.pos = string.end()
+                continue
+            self.pos = match.end()
+            depth += 1 if char in '[{' else -1
+            if depth == 0:
+                return
+
+
+def _walk(reader, parts):
+    if not parts:
+        yield reader.value()
+        return
+    part, rest = parts[0], parts[1:]
+    char = reader.peek()
+    if part == 'item':
+        if char != '[':
+            reader.skip()
+            return
+        reader.pos += 1
+        if reader.peek() == ']':
+            reader.pos += 1
+            return
+        while True:
+            yield from _walk(reader, rest)
+            if reader.expect(',]') == ']':
+                return
+    if char != '{':
+        reader.skip()
+        return
+    reader.pos += 1
+    if reader.peek() == '}':
+        reader.pos += 1
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == part:
+            yield from _walk(reader, rest)
+        else:
+            reader.skip()
+        if reader.expect(',}') == '}':
+            return
+
+
+def iter_json(source, path='item', fields=None, chunk_size=65536):
+    """Yield the values found at ``path`` in a JSON document.
+
+    ``source`` is a response (ideally streamed), bytes or an iterable of byte
+    chunks. ``path`` is dot-separated object keys, with ``item`` standing for
+    every element of an array: ``'item'`` is each element of a top-level
+    list, ``'data.results.item'`` each element of ``data.results``. Paths
+    that don't exist yield nothing. With ``fields``, object values are cut
+    down to just those keys as they are produced.
+    """
+    if hasattr(source, 'iter_content'):
+        chunks = source.iter_content(chunk_size)
+    elif isinstance(source, (bytes, bytearray)):
+        chunks = [bytes(source)]
+    else:
+        chunks = source
+    reader = _Reader(chunks)
+    if reader.peek() == '':
+        return
+    for value in _walk(reader, path.split('.') if path else []):
+        if fields is not None and isinstance(value, dict):
+            value = {field: value[field] for field in fields if field in value}
+        yield value
@@ -0,0 +1,229 @@
+"""HTML extraction helpers for the scrapers.
+
+Scrapers usually want one kind of element out of a large page (the code
+cells of a grid, a form's hidden inputs), so a Document is told up front
+which tags it will be asked for and extraction goes by tag name plus exact
+attribute values. It uses the fastest backend installed: selectolax, then
+lxml, then a streaming stdlib ``html.parser`` pass that only keeps the
+wanted tags and never builds a tree. Pages are read from the raw response
+bytes rather than ``response.text``, which skips requests' charset
+guessing (and its ISO-8859-1 default for text/html).
+
+``soup()`` is still there for the odd query that needs the full
+BeautifulSoup API; it uses lxml when installed and a SoupStrainer to build
+only the requested elements.
+"""
+import re
+
+from html.parser import HTMLParser as _StdlibParser
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+if HTMLParser is not None:
+    BACKEND = 'selectolax'
+elif lxml is not None:
+    BACKEND = 'lxml'
+else:
+    BACKEND = 'html.parser'
+
+SOUP_FEATURES = 'lxml' if lxml is not None else 'html.parser'
+
+_HEADER_CHARSET = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.I)
+
+# Tags that are closed implicitly by the next sibling of the same name or by
+# the end of their container, and tags that never have content
+_SELF_CLOSING_SIBLINGS = {'td', 'th', 'tr', 'li', 'option', 'p', 'dt', 'dd'}
+_CLOSED_BY_END = {
+    'tr': {'td', 'th'},
+    'thead': {'tr', 'td', 'th'},
+    'tbody': {'tr', 'td', 'th'},
+    'tfoot': {'tr', 'td', 'th'},
+    'table': {'tr', 'td', 'th'},
+    'ul': {'li'},
+    'ol': {'li'},
+    'select': {'option'},
+    'dl': {'dt', 'dd'},
+}
+_VOID = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+def _source(page):
+    """Split a response, bytes or str into (markup, declared encoding or None)."""
+    if hasattr(page, 'content'):
+        match = _HEADER_CHARSET.search(page.headers.get('Content-Type', ''))
+        return page.content, match.group(1) if match else None
+    return page, None
+
+
+def _decode(markup, encoding):
+    if isinstance(markup, str):
+        return markup
+    if encoding is None:
+        match = _META_CHARSET.search(markup[:2048])
+        encoding = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        return markup.decode(encoding)
+    except (LookupError, UnicodeDecodeError):
+        return markup.decode('cp1252', 'replace')
+
+
+def soup(page, name=None, attrs=None):
+    """BeautifulSoup of a page, limited to the matching elements if name/attrs are given."""
+    markup, encoding = _source(page)
+    strainer = SoupStrainer(name, attrs or {}) if name or attrs else None
+    kwargs = {'from_encoding': encoding} if encoding and isinstance(markup, bytes) else {}
+    return BeautifulSoup(markup, SOUP_FEATURES, parse_only=strainer, **kwargs)
+
+
+def _css(name, attrs):
+    selector = name or '*'
+    for attr, value in (attrs or {}).items():
+        if attr == 'class':
+            selector += '.' + value
+        else:
+            selector += '[{}="{}"]'.format(attr, value.replace('\\', '\\\\').replace('"', '\\"'))
+    return selector
+
+
+def _xpath(name, attrs):
+    def literal(value):
+        if '"' not in value:
+            return f'"{value}"'
+        if "'" not in value:
+            return f"'{value}'"
+        return 'concat(' + ', \'"\', '.join(f'"{part}"' for part in value.split('"')) + ')'
+
+    tests = []
+    for attr, value in (attrs or {}).items():
+        if attr == 'class':
+            tests.append(f'contains(concat(" ", normalize-space(@class), " "), {literal(" " + value + " ")})')
+        else:
+            tests.append(f'@{attr}={literal(value)}')
+    return '//' + (name or '*') + (f'[{" and ".join(tests)}]' if tests else '')
+
+
+class _Element:
+    __slots__ = ('name', 'attrs', 'parts')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.parts = []
+
+    def text(self):
+        return ''.join(self.parts)
+
+
+class _Extractor(_StdlibParser):
+    """One pass over the markup keeping only the wanted tags and their text."""
+
+    def __init__(self, only):
+        super().__init__()
+        self.only = only # set of tag names, or None for all of them
+        self.elements = []
+        self.open = [] # wanted elements still collecting text
+
+    def handle_starttag(self, tag, attrs):
+        if self.only is not None and tag not in self.only:
+            return
+        if tag in _SELF_CLOSING_SIBLINGS:
+            self._close(tag)
+        element = _Element(tag, dict(attrs))
+        self.elements.append(element)
+        if tag not in _VOID:
+            self.open.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.only is None or tag in self.only:
+            self.elements.append(_Element(tag, dict(attrs)))
+
+    def handle_endtag(self, tag):
+        if not self._close(tag) and tag in _CLOSED_BY_END:
+            implied = _CLOSED_BY_END[tag]
+            self.open = [element for element in self.open if element.name not in implied]
+
+    def _close(self, tag):
+        for i in range(len(self.open) - 1, -1, -1):
+            if self.open[i].name == tag:
+                del self.open[i:]
+                return True
+        return False
+
+    def handle_data(self, data):
+        for element in self.open:
+            element.parts.append(data)
+
+
+def _matches(element, attrs):
+    for attr, value in attrs.items():
+        actual = element.attrs.get(attr)
+        if actual is None:
+            return False
+        if attr == 'class' and value not in actual.split() or attr != 'class' and actual != value:
+            return False
+    return True
+
+
+class Document:
+    """One parsed page to run several extractions against.
+
+    ``only`` lists the tag names the caller will ask for; the stdlib backend
+    keeps just those, while selectolax and lxml are fast enough to build the
+    whole tree.
+    """
+
+    def __init__(self, page, only=None):
+        markup, encoding = _source(page)
+        self.tree = None
+        if not markup:
+            return
+        if BACKEND == 'selectolax':
+            self.tree = HTMLParser(_decode(markup, encoding) if encoding else markup)
+        elif BACKEND == 'lxml':
+            parser = lxml.html.HTMLParser(encoding=encoding) if isinstance(markup, bytes) and encoding else None
+            self.tree = lxml.html.document_fromstring(markup, parser=parser)
+        else:
+            extractor = _Extractor(set(only) if only else None)
+            extractor.feed(_decode(markup, encoding))
+            extractor.close()
+            self.tree = extractor.elements
+
+    def _nodes(self, name, attrs):
+        # (text getter, attribute mapping) for each matching element
+        if self.tree is None:
+            return []
+        if BACKEND == 'selectolax':
+            return [(node.text, node.attributes) for node in self.tree.css(_css(name, attrs))]
+        if BACKEND == 'lxml':
+            return [(node.text_content, node.attrib) for node in self.tree.xpath(_xpath(name, attrs))]
+        return [
+            (element.text, element.attrs) for element in self.tree
+            if (name is None or element.name == name) and _matches(element, attrs or {})
+        ]
+
+    def select(self, name=None, attrs=None):
+        """Text of every element with tag ``name`` and the given attribute values.
+
+        ``attrs`` maps attribute names to exact values, except ``class``,
+        which matches any element carrying that class.
+        """
+        return [text() for text, _ in self._nodes(name, attrs)]
+
+    def attributes(self, name=None, attrs=None):
+        """Attribute dicts of the matching elements, in document order."""
+        return [dict(node_attrs) for _, node_attrs in self._nodes(name, attrs)]
+
+    def form_fields(self):
+        """{name: value} of the hidden form inputs (ASP.NET/PeopleSoft state and the like)."""
+        return {a.get('name'): a.get('value') for a in self.attributes('input', {'type': 'hidden'})}
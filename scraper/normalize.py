@@ -0,0 +1,86 @@
+"""Declarative code normalization shared by the scrapers.
+
+A school lists its cleanup as ``rules``: ``Translate`` for per-character
+replacements and deletions (one ``str.translate`` call, with consecutive
+Translates merged into a single table) and ``Sub`` for regex rewrites,
+compiled once. ``Normalizer`` applies them to every code in one pass,
+then deduplicates and drops codes that don't match COURSE_CODE_REGEX,
+keeping the rejects so the run can report them instead of leaving them
+for validate-trie to trip over.
+"""
+import os
+import re
+
+_REGEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'course_code_regex.txt')
+with open(_REGEX_PATH, 'r', encoding='utf-8') as f:
+    COURSE_CODE_REGEX = f.read().strip()
+
+
+class Translate:
+    """Replace single characters: ``Translate({'-': ' ', '.': None})``;
+    None (or '') deletes the character."""
+
+    def __init__(self, mapping):
+        self.mapping = {ord(k): v or None for k, v in mapping.items()}
+
+    def then(self, other):
+        """One Translate equivalent to applying self, then other."""
+        merged = Translate({})
+        for char, value in self.mapping.items():
+            merged.mapping[char] = value.translate(other.mapping) or None if value else None
+        for char, value in other.mapping.items():
+            merged.mapping.setdefault(char, value)
+        return merged
+
+    def apply(self, code):
+        return code.translate(self.mapping)
+
+
+class Sub:
+    """``re.sub(pattern, repl, code)`` with the pattern compiled once."""
+
+    def __init__(self, pattern, repl, flags=0):
+        self.regex = re.compile(pattern, flags)
+        self.repl = repl
+
+    def apply(self, code):
+        return self.regex.sub(self.repl, code)
+
+
+class Normalizer:
+    """Compiled rules plus dedup and COURSE_CODE_REGEX filtering.
+
+    ``run`` returns the sorted, unique, valid codes; afterwards ``rejected``
+    holds the normalized codes that failed the regex and ``duplicates`` the
+    number of codes that normalized to one already seen.
+    """
+
+    def __init__(self, rules=(), pattern=COURSE_CODE_REGEX):
+        steps = []
+        for rule in rules:
+            if isinstance(rule, Translate) and steps and isinstance(steps[-1], Translate):
+                steps[-1] = steps[-1].then(rule)
+            else:
+                steps.append(rule)
+        self.steps = [step.apply for step in steps]
+        self.match = re.compile(pattern).match
+        self.rejected = []
+        self.duplicates = 0
+
+    def run(self, codes):
+        steps, match = self.steps, self.match
+        seen = set()
+        rejected = set()
+        duplicates = 0
+        for code in codes:
+            for step in steps:
+                code = step(code)
+            if code in seen:
+                duplicates += 1
+            elif match(code):
+                seen.add(code)
+            else:
+                rejected.add(code)
+        self.rejected = sorted(rejected)
+        self.duplicates = duplicates
+        return sorted(seen)
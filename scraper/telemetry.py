@@ -0,0 +1,172 @@
+"""Per-run scrape metrics and the JSON run report.
+
+The Fetcher records every request (latency, time spent waiting, bytes,
+status, attempts, whether it came from the cache) and the scraper records
+every parsed unit (parse time, codes found). Latency is the network call
+alone, up to the response headers for streamed requests; waiting for a
+host slot, the politeness delay and retry backoff are kept apart as
+``wait_seconds`` so they don't hide how fast the endpoint itself is.
+Bytes are decoded body bytes throughout. ``report`` rolls them up per host with p50/p95
+latencies so slow endpoints and good concurrency limits are easy to spot;
+``main.py scrape-report`` prints it.
+"""
+import json
+import math
+import os
+import threading
+import time
+
+from urllib.parse import urlparse
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _stats(values):
+    return {
+        'count': len(values),
+        'total': round(sum(values), 6),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'max': max(values) if values else None,
+    }
+
+
+class Telemetry:
+    """Thread-safe collector for one school's run."""
+
+    def __init__(self, school):
+        self.school = school
+        self.started = time.time()
+        self._clock = time.perf_counter()
+        self.finished = None
+        self.wall = None
+        self.requests = []
+        self.units = []
+        self.failures = []
+        self.rejected = [] # normalized codes failing COURSE_CODE_REGEX
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    def request(self, request, response, seconds):
+        """Record a finished request that took ``seconds`` end to end.
+
+        A streamed body is counted as it is read through ``iter_content``
+        (which ``response.content`` and ``iter_json`` both use).
+        """
+        latency = getattr(response, 'latency', None)
+        waited = getattr(response, 'waited', None)
+        record = {
+            'method': request.method,
+            'url': request.url,
+            'host': urlparse(request.url).netloc,
+            'status': response.status_code,
+            'seconds': round(latency, 6) if latency is not None else None,
+            'wait_seconds': round(waited, 6) if waited is not None else None,
+            'total_seconds': round(seconds, 6),
+            'bytes': 0 if request.stream else len(response.content),
+            'attempts': getattr(response, 'attempts', 0) or 0,
+        }
+        # Responses answered from disk without any network attempt
+        record['cached'] = record['attempts'] == 0
+        if request.stream:
+            iter_content = response.iter_content
+
+            def counted(*args, **kwargs):
+                for chunk in iter_content(*args, **kwargs):
+                    record['bytes'] += len(chunk)
+                    yield chunk
+            response.iter_content = counted
+        with self._lock:
+            self.requests.append(record)
+        return record
+
+    def failed(self, request, error, attempts):
+        with self._lock:
+            self.failures.append({
+                'method': request.method,
+                'url': request.url,
+                'host': urlparse(request.url).netloc,
+                'error': error,
+                'attempts': attempts,
+            })
+
+    def parsed(self, unit, seconds, codes, new=None):
+        with self._lock:
+            self.units.append({'unit': str(unit), 'parse_seconds': round(seconds, 6), 'codes': codes, 'new': new})
+
+    def normalized(self, rejected, duplicates):
+        self.rejected = list(rejected)
+        self.duplicates = duplicates
+
+    def finish(self):
+        self.finished = time.time()
+        self.wall = time.perf_counter() - self._clock
+
+    def report(self):
+        """Summary plus the raw records, ready for json.dump."""
+        wall = self.wall if self.wall is not None else time.perf_counter() - self._clock
+        with self._lock:
+            requests, units, failures = list(self.requests), list(self.units), list(self.failures)
+
+        hosts = {}
+        for record in requests:
+            hosts.setdefault(record['host'], []).append(record)
+        host_summaries = {}
+        for host, records in sorted(hosts.items()):
+            network = [r for r in records if not r['cached'] and r['seconds'] is not None]
+            statuses = {}
+            for r in records:
+                statuses[str(r['status'])] = statuses.get(str(r['status']), 0) + 1
+            host_summaries[host] = {
+                'requests': len(records),
+                'cached': len(records) - len(network),
+                'latency': _stats([r['seconds'] for r in network]),
+                'wait': _stats([r['wait_seconds'] or 0 for r in network]),
+                'bytes': sum(r['bytes'] or 0 for r in records),
+                'retries': sum(max(0, r['attempts'] - 1) for r in records),
+                'statuses': statuses,
+                'failures': sum(1 for f in failures if f['host'] == host),
+            }
+
+        total_bytes = sum(r['bytes'] or 0 for r in requests)
+        network = [r for r in requests if not r['cached'] and r['seconds'] is not None]
+        return {
+            'school': self.school,
+            'started': self.started,
+            'finished': self.finished,
+            'summary': {
+                'wall_seconds': round(wall, 3),
+                'requests': len(requests),
+                'cached': sum(1 for r in requests if r['cached']),
+                'failures': len(failures),
+                'retries': sum(max(0, r['attempts'] - 1) for r in requests) + sum(max(0, f['attempts'] - 1) for f in failures),
+                'bytes': total_bytes,
+                'requests_per_second': round(len(requests) / wall, 3) if wall else None,
+                'bytes_per_second': round(total_bytes / wall, 1) if wall else None,
+                'latency': _stats([r['seconds'] for r in network]),
+                'wait': _stats([r['wait_seconds'] or 0 for r in network]),
+                'parse': _stats([u['parse_seconds'] for u in units]),
+                'codes_per_unit': _stats([u['codes'] for u in units]),
+                'duplicates': self.duplicates,
+                'rejected': len(self.rejected),
+            },
+            'hosts': host_summaries,
+            'units': units,
+            'requests': requests,
+            'failures': failures,
+            'rejected': self.rejected,
+        }
+
+    def write(self, path):
+        report = self.report()
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+        os.replace(tmp, path)
+        return report
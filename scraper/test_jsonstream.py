@@ -0,0 +1,39 @@
+import json
+import unittest
+
+from .jsonstream import iter_json
+
+DOCUMENTS = [
+    (b'[1.25, 2]', 'item'),
+    (b'[1, 22, 333, 4444.5]', 'item'),
+    (b'[-0.5e-3, 1E+20, 7e2, true, null, "x"]', 'item'),
+    (b'{"data": {"total": 1234.5, "results": [{"a": 10.75}, {"a": -3e1}], "n": 99}}', 'data.results.item'),
+    (b'{"meta": 12.5e3, "data": [1.5, {"x": 2.25}]}', 'data.item'),
+]
+
+
+class ChunkBoundaryTest(unittest.TestCase):
+    """A chunk boundary anywhere in the document must not change what is read."""
+
+    def test_split_at_every_offset(self):
+        for document, path in DOCUMENTS:
+            expected = list(iter_json(document, path))
+            whole = json.loads(document)
+            for part in path.split('.'):
+                whole = whole if part == 'item' else whole[part]
+            self.assertEqual(expected, whole)
+            for cut in range(1, len(document)):
+                with self.subTest(document=document, cut=cut):
+                    self.assertEqual(list(iter_json([document[:cut], document[cut:]], path)), expected)
+
+    def test_small_chunks(self):
+        for document, path in DOCUMENTS:
+            expected = list(iter_json(document, path))
+            for size in (1, 2, 3, 5):
+                with self.subTest(document=document, size=size):
+                    chunks = [document[i:i + size] for i in range(0, len(document), size)]
+                    self.assertEqual(list(iter_json(chunks, path)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()